@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import hmac
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+from backend import ARCHIVED_TERM, Database
+from roster import RosterIndex, resolve_checkin
+import metrics
+import qrpayload
+
+# Local HTTP/JSON API over the attendance Database (stdlib asyncio only):
+#   python api.py --host 0.0.0.0 --port 8765 --token secret
+#
+#   GET    /api/health
+#   GET    /api/subjects                       POST /api/subjects {"name": "Math"}
+#   DELETE /api/subjects/<name>
+#   POST   /api/checkin   {"course", "room", "payload"}   (or "student_id" + "name")
+#   POST   /api/checkins  {"course", "room", "items": [payload, ...]}   one transaction
+#   GET    /api/attendance?date=YYYY-MM-DD&subject=Math
+#   GET    /api/stats/<course>
+#
+# The event loop only parses HTTP. Database calls run on a fixed pool of worker
+# threads (each holds one read connection; writes go through the Database writer
+# thread), and at most `pool_size * QUEUE_PER_WORKER` calls may be queued, so a
+# burst of requests waits in the loop instead of piling up threads or connections.
+
+MAX_HEADER = 16 * 1024
+MAX_BODY = 1024 * 1024
+MAX_BULK = 1000
+QUEUE_PER_WORKER = 4
+IDLE_TIMEOUT = 30.0
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AttendanceAPI:
+    def __init__(self, db, pool_size=8, max_connections=256, token=None, roster=None,
+                 key_path=qrpayload.KEY_FILE, accept_legacy=True):
+        self.db = db
+        self.roster = roster if roster is not None else RosterIndex(db)
+        self.key_path = key_path
+        self.accept_legacy = accept_legacy
+        self.token = token
+        self.pool_size = pool_size
+        self.max_connections = max_connections
+        self.pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="api-db")
+        self.connections = 0
+        self._slots = None      # asyncio.Semaphore, created on the serving loop
+        self._handlers = set()  # one task per open connection
+        self.routes = {
+            ("GET", "health"): self.health,
+            ("GET", "subjects"): self.list_subjects,
+            ("POST", "subjects"): self.add_subject,
+            ("DELETE", "subjects"): self.delete_subject,
+            ("POST", "checkin"): self.checkin,
+            ("POST", "checkins"): self.checkins,
+            ("GET", "attendance"): self.attendance,
+            ("GET", "stats"): self.stats,
+        }
+
+    # --- database calls (worker threads) ---
+    async def run(self, fn, *args):
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    def _checkin(self, course, room, item):
+        std_id, std_name, error = self._resolve(course, item)
+        if error:
+            metrics.inc("rejected")
+            return {"success": False, "student_id": std_id, "student_name": std_name, "message": error}
+        success, msg = self.db.save_attendance(std_id, std_name, course, room)
+        metrics.inc("checkins" if success else "rejected" if msg == ARCHIVED_TERM else "duplicates")
+        return {"success": success, "student_id": std_id, "student_name": std_name, "message": msg}
+
+    def _checkins(self, course, room, items):
+        # Validate everything first, then write all accepted rows in one transaction
+        results, records, slots = [], [], []
+        for item in items:
+            std_id, std_name, error = self._resolve(course, item)
+            results.append({"success": False, "student_id": std_id, "student_name": std_name, "message": error})
+            if error:
+                metrics.inc("rejected")
+            else:
+                records.append((std_id, std_name))
+                slots.append(len(results) - 1)
+        if records:
+            time_str = datetime.now().strftime("%H:%M:%S")
+            for i, ok in zip(slots, self.db.save_attendance_bulk(records, course, room)):
+                results[i]["success"] = bool(ok)
+                if ok is None:
+                    results[i]["message"] = ARCHIVED_TERM
+                    metrics.inc("rejected")
+                    continue
+                results[i]["message"] = f"ເຊັກຊື່ສຳເລັດເວລາ {time_str}" if ok else "ເຊັກຊື່ຊ້ຳ (Duplicate Check-in)"
+                metrics.inc("checkins" if ok else "duplicates")
+        return results
+
+    def _resolve(self, course, item):
+        # item: a scanned payload string, or {"payload": ...} / {"student_id": ..., "name": ...}
+        if isinstance(item, dict):
+            if "payload" in item:
+                item = item["payload"]
+            elif item.get("student_id") and item.get("name"):
+                item = f"{item['student_id']}|{item['name']}"
+        if not isinstance(item, str):
+            return None, None, qrpayload.INVALID_FORMAT
+        return resolve_checkin(item, course, self.roster, self.db, self.key_path, self.accept_legacy)
+
+    # --- handlers: (query, body, arg) -> (status, json-able) ---
+    async def health(self, query, body, arg):
+        return 200, {"ok": True, "connections": self.connections, "pool": self.pool_size}
+
+    async def list_subjects(self, query, body, arg):
+        return 200, await self.run(self.db.get_subjects)
+
+    async def add_subject(self, query, body, arg):
+        name = str((body or {}).get("name", "")).strip()
+        if not name:
+            raise ApiError(400, "name is required")
+        if not await self.run(self.db.add_subject, name):
+            raise ApiError(409, f"Subject already exists: {name}")
+        return 201, {"name": name}
+
+    async def delete_subject(self, query, body, arg):
+        if not arg:
+            raise ApiError(400, "subject name is required")
+        await self.run(self.db.delete_subject, arg)
+        return 200, {"deleted": arg}
+
+    async def checkin(self, query, body, arg):
+        course, room = self._session(body)
+        item = body.get("payload") or {"student_id": body.get("student_id"), "name": body.get("name")}
+        return 200, await self.run(self._checkin, course, room, item)
+
+    async def checkins(self, query, body, arg):
+        course, room = self._session(body)
+        items = body.get("items")
+        if not isinstance(items, list) or not items:
+            raise ApiError(400, "items must be a non-empty list")
+        if len(items) > MAX_BULK:
+            raise ApiError(413, f"at most {MAX_BULK} items per request")
+        results = await self.run(self._checkins, course, room, items)
+        return 200, {"saved": sum(r["success"] for r in results), "results": results}
+
+    async def attendance(self, query, body, arg):
+        day = query.get("date") or datetime.now().strftime("%Y-%m-%d")
+        try:
+            datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            raise ApiError(400, "date must be YYYY-MM-DD")
+        rows = await self.run(self.db.get_attendance_by_date, day, query.get("subject") or None)
+        keys = ("id", "student_id", "student_name", "course", "room", "date_time")
+        return 200, [dict(zip(keys, r)) for r in rows]
+
+    async def stats(self, query, body, arg):
+        if not arg:
+            raise ApiError(400, "course is required")
+        rows = await self.run(self.db.get_subject_stats, arg)
+        return 200, [{"student_name": name, "count": count} for name, count in rows]
+
+    @staticmethod
+    def _session(body):
+        if not isinstance(body, dict):
+            raise ApiError(400, "JSON object body required")
+        course, room = str(body.get("course", "")).strip(), str(body.get("room", "")).strip()
+        if not course or not room:
+            raise ApiError(400, "course and room are required")
+        return course, room
+
+    # --- HTTP ---
+    async def dispatch(self, method, target, headers, raw_body):
+        if self.token:
+            auth = headers.get("authorization", "")
+            if not hmac.compare_digest(auth, f"Bearer {self.token}"):
+                raise ApiError(401, "invalid or missing token")
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        if len(parts) < 2 or parts[0] != "api":
+            raise ApiError(404, "not found")
+        handler = self.routes.get((method, parts[1]))
+        if handler is None:
+            if any(name == parts[1] for _, name in self.routes):
+                raise ApiError(405, "method not allowed")
+            raise ApiError(404, "not found")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = None
+        if raw_body:
+            try:
+                body = json.loads(raw_body)
+            except ValueError:
+                raise ApiError(400, "invalid JSON")
+        return await handler(query, body, "/".join(parts[2:]))
+
+    async def handle(self, reader, writer):
+        if self.connections >= self.max_connections:
+            await self._respond(writer, 503, {"error": "too many connections"}, keep_alive=False)
+            writer.close()
+            return
+        self.connections += 1
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, {"error": "headers too large"}, keep_alive=False)
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "bad request line"}, keep_alive=False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    break
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "body too large"}, keep_alive=False)
+                    break
+                raw_body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                start = asyncio.get_running_loop().time()
+                try:
+                    status, payload = await self.dispatch(method.upper(), target, headers, raw_body)
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                metrics.observe("api", asyncio.get_running_loop().time() - start)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Only serve() cancels handlers, on shutdown. Ending normally keeps asyncio's
+            # stream callback from logging the cancelled task as an error.
+            pass
+        finally:
+            self.connections -= 1
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive=True):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host="127.0.0.1", port=8765, ready=None):
+        self._slots = asyncio.Semaphore(self.pool_size * QUEUE_PER_WORKER)
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER, backlog=1024)
+        if ready:
+            ready(server.sockets[0].getsockname()[:2])
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                # Keep-alive connections run in their own tasks; finish them while the loop is alive
+                handlers = list(self._handlers)
+                for task in handlers:
+                    task.cancel()
+                await asyncio.gather(*handlers, return_exceptions=True)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+class ApiServer:
+    # Runs an AttendanceAPI on its own event-loop thread, e.g. inside the GUI or a test:
+    #   server = ApiServer(db).start(); ... server.address ...; server.stop()
+    def __init__(self, db, host="127.0.0.1", port=0, **api_kwargs):
+        self.api = AttendanceAPI(db, **api_kwargs)
+        self.host, self.port = host, port
+        self.address = None
+        self.loop = None
+        self.thread = None
+        self._task = None
+
+    def start(self):
+        started = threading.Event()
+
+        def ready(address):
+            self.address = address
+            started.set()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self._task = self.loop.create_task(self.api.serve(self.host, self.port, ready))
+            try:
+                self.loop.run_until_complete(self._task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        if not started.wait(10):
+            raise RuntimeError("API server did not start")
+        return self
+
+    def stop(self):
+        if self.loop and self._task:
+            self.loop.call_soon_threadsafe(self._task.cancel)
+            self.thread.join(5)
+        self.api.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP API for remote check-ins and queries")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to accept phones/PCs on the LAN")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default="attendance.db")
+    parser.add_argument("--pool", type=int, default=8, help="database worker threads")
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--token", help="require 'Authorization: Bearer <token>'")
+    parser.add_argument("--key", default=qrpayload.KEY_FILE)
+    parser.add_argument("--signed-only", action="store_true", help="reject plain id|name cards")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    api = AttendanceAPI(db, pool_size=args.pool, max_connections=args.max_connections, token=args.token,
+                        key_path=args.key, accept_legacy=not args.signed_only)
+    try:
+        asyncio.run(api.serve(args.host, args.port,
+                              ready=lambda addr: print(f"Listening on http://{addr[0]}:{addr[1]}/api/", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import os
+import sqlite3
+
+# Closed terms are moved out of the live attendance table into one SQLite file per
+# term (archives/<db>_<term>.db). The aggregate tables keep counting archived rows,
+# so the Stats tab and per-student totals never open an archive; date-range queries
+# attach only the archives of terms that overlap the requested range.
+#   python archive.py close 2025-S1 --from 2025-01-06 --to 2025-05-31
+#   python archive.py list
+#   python archive.py compact
+
+ARCHIVE_DIR = "archives"
+# SQLite allows 10 attached databases per connection by default
+MAX_ATTACHED = 9
+ARCHIVE_COLUMNS = "id, student_id, student_name, course_code, room, date_time, day, ts"
+COPY_CHUNK = 5000
+
+
+def archive_path(db_path, term):
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in term)
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), ARCHIVE_DIR, f"{base}_{safe}.db")
+
+
+def main_path(conn):
+    # File of the connection's main database ("" for in-memory)
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return path or ""
+    return ""
+
+
+def resolve(conn, path):
+    # terms.path is stored relative to the live database, so the pair can be moved together
+    return os.path.join(os.path.dirname(main_path(conn)), path)
+
+
+def overlapping_terms(conn, start_day, end_day):
+    # [(id, name, start_day, end_day, path, rows)] of archived terms touching the range
+    return conn.execute("""
+        SELECT id, name, start_day, end_day, path, rows FROM terms
+        WHERE start_day <= ? AND end_day >= ?
+        ORDER BY start_day
+    """, (end_day, start_day)).fetchall()
+
+
+def sources(conn, start_day, end_day):
+    # Tables holding attendance rows between the two days: the live table plus the
+    # archive of each overlapping term, attached to conn on first use.
+    terms = overlapping_terms(conn, start_day, end_day)
+    if not terms:
+        return ["attendance"]
+    if len(terms) > MAX_ATTACHED:
+        raise ValueError(f"Date range spans {len(terms)} archived terms (at most {MAX_ATTACHED}); narrow it")
+    needed = {f"term_{t[0]}": t for t in terms}
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")} - {"main", "temp"}
+    if len(attached | needed.keys()) > MAX_ATTACHED:
+        for alias in attached - needed.keys():
+            conn.execute(f"DETACH DATABASE {alias}")
+    for alias, (_, name, _, _, path, _) in needed.items():
+        if alias in attached:
+            continue
+        full = resolve(conn, path)
+        # ATTACH would silently create an empty file
+        if not os.path.exists(full):
+            raise FileNotFoundError(f"Archive of term {name} is missing: {full}")
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (full,))
+    return ["attendance"] + [f"{alias}.attendance" for alias in needed]
+
+
+def union(tables, select, params):
+    # select: one SELECT with a {table} placeholder, run against every source.
+    # Returns (sql, params); a single source is the plain query.
+    if len(tables) == 1:
+        return select.format(table=tables[0]), list(params)
+    sql = " UNION ALL ".join(f"SELECT * FROM ({select.format(table=t)})" for t in tables)
+    return sql, list(params) * len(tables)
+
+
+def create_archive(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE attendance (
+            id INTEGER PRIMARY KEY,
+            student_id TEXT,
+            student_name TEXT,
+            course_code TEXT,
+            room TEXT,
+            date_time TEXT,
+            day TEXT,
+            ts INTEGER
+        )
+    """)
+    return conn
+
+
+def copy_term(src, path, start_day, end_day):
+    # Writes the term's rows (with their display name resolved) to a new archive file
+    # and returns the (id, student_id, course_code, ts) of every copied row, so the
+    # caller can delete exactly those. src is only read.
+    out = create_archive(path)
+    copied = []
+    try:
+        cur = src.execute(f"""
+            SELECT a.id, a.student_id, COALESCE(s.name, a.student_name), a.course_code, a.room,
+                   a.date_time, a.day, a.ts
+            FROM attendance a
+            LEFT JOIN students s ON s.student_id = a.student_id
+            WHERE a.day >= ? AND a.day <= ?
+            ORDER BY a.id
+        """, (start_day, end_day))
+        while True:
+            rows = cur.fetchmany(COPY_CHUNK)
+            if not rows:
+                break
+            out.executemany(f"INSERT INTO attendance ({ARCHIVE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            copied.extend((r[0], r[1], r[3], r[7]) for r in rows)
+        # Same access paths as the live table; built after the bulk insert
+        out.execute("CREATE INDEX idx_attendance_day_course ON attendance (day, course_code)")
+        out.execute("CREATE INDEX idx_attendance_course_day ON attendance (course_code, day)")
+        out.execute("CREATE INDEX idx_attendance_student ON attendance (student_id)")
+        out.execute("ANALYZE")
+        out.commit()
+    finally:
+        out.close()
+    return copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive closed terms and compact the attendance database")
+    parser.add_argument("--db", default="attendance.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    close = sub.add_parser("close", help="move a closed term into its own archive file")
+    close.add_argument("term", help='term name, e.g. "2025-S1"')
+    close.add_argument("--from", dest="start", required=True, help="first day, YYYY-MM-DD")
+    close.add_argument("--to", dest="end", required=True, help="last day, YYYY-MM-DD")
+    close.add_argument("--no-compact", action="store_true", help="skip VACUUM/REINDEX afterwards")
+    sub.add_parser("list", help="show archived terms")
+    sub.add_parser("compact", help="VACUUM, REINDEX and ANALYZE the live database")
+    args = parser.parse_args(argv)
+
+    from backend import Database
+    db = Database(args.db)
+    try:
+        if args.command == "close":
+            n = db.archive_term(args.term, args.start, args.end)
+            print(f"Archived {n} rows of {args.term} ({args.start} .. {args.end})")
+            if not args.no_compact:
+                before, after = db.compact()
+                print(f"Compacted {args.db}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+        elif args.command == "list":
+            for name, start, end, path, rows, archived_at in db.get_terms():
+                print(f"{name}\t{start} .. {end}\t{rows} rows\t{path}\t(archived {archived_at})")
+        elif args.command == "compact":
+            before, after = db.compact()
+            print(f"Compacted {args.db}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,156 @@ import qrcode
 from PIL import ImageTk, Image
 from datetime import datetime
 import os
+import tempfile
+import time
+import queue
+import threading
+import weakref
+from concurrent.futures import Future
+import metrics
+import archive
+
+# Bump together with a new entry in Database.MIGRATIONS; stored in PRAGMA user_version
+SCHEMA_VERSION = 6
+
+# Display name of an attendance row `a` joined with students `s`
+# (rows from before the roster existed may still carry their own name)
+NAME_SQL = "COALESCE(s.name, a.student_name, '')"
+# All-time check-ins of the student in row `a`, live and archived
+TOTAL_SQL = "(SELECT COALESCE(SUM(g.count), 0) FROM agg_course_student g WHERE g.student_id = a.student_id)"
+
+def _close_reader(conn, readers, lock):
+    with lock:
+        readers.discard(conn)
+    conn.close()
+
+
+class _ReaderSlot:
+    # One thread's read connection, kept in Database._local. When the thread exits its
+    # thread-local storage is dropped, the slot is collected and the connection closed,
+    # so short-lived threads (camera runs, imports, API workers) don't each leave one open.
+    def __init__(self, conn, readers, lock):
+        self.conn = conn
+        weakref.finalize(self, _close_reader, conn, readers, lock)
+
+
+# save_attendance result for a backdated scan that falls inside an archived term
+ARCHIVED_TERM = "ພາກຮຽນນີ້ຖືກຈັດເກັບແລ້ວ (Archived term, read-only)"
+
 
 class Database:
-    def __init__(self, db_name="attendance.db"):
-        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+    # Writes (check-ins, deletes, subjects) are funnelled through one writer thread
+    # that owns self.conn and commits queued operations together in short batches.
+    # Every thread that reads gets its own connection; in WAL mode readers never
+    # block the writer or each other.
+    def __init__(self, db_name="attendance.db", synchronous="FULL", batch_max=200, batch_window=0.0):
+        # ":memory:" gets a private temp file, removed by close(): a shared-cache memory
+        # database uses table locks, so concurrent readers fail with "table is locked"
+        self._temp = None
+        if db_name == ":memory:":
+            fd, db_name = tempfile.mkstemp(prefix="attendance-", suffix=".db")
+            os.close(fd)
+            self._temp = db_name
+        self.db_name = db_name
+        # FULL fsyncs the WAL on every commit, so a check-in reported as saved survives
+        # a power cut; batching amortises that fsync across queued check-ins.
+        # NORMAL is faster but may lose the last commits on power loss.
+        self.synchronous = synchronous
+        self.batch_max = batch_max
+        self.batch_window = batch_window
+
+        self.conn = self._connect()
+        self.conn.execute("PRAGMA journal_mode=WAL")
         self.cursor = self.conn.cursor()
         self.create_table()
+        # From here on self.conn/self.cursor belong to the writer thread only
+        self._local = threading.local()
+        self._readers = set()
+        self._readers_lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._roster_listeners = []
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        return conn
+
+    def _reader(self):
+        # Connection for read queries, one per calling thread (closed when the thread exits)
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            if self._closed:
+                raise RuntimeError("Database is closed")
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = ON")
+            with self._readers_lock:
+                self._readers.add(conn)
+            slot = self._local.slot = _ReaderSlot(conn, self._readers, self._readers_lock)
+        return slot.conn
+
+    def _write(self, op):
+        # Queue op(cursor) for the writer thread and wait until its batch is committed.
+        # Returns op's result, or raises its exception.
+        fut = Future()
+        with self._close_lock:
+            # After close() the writer is gone and nothing would ever resolve fut
+            if self._closed:
+                raise RuntimeError("Database is closed")
+            self._writes.put((op, fut))
+        return fut.result()
+
+    def _writer_loop(self):
+        cur = self.cursor
+        while True:
+            item = self._writes.get()
+            if item is None:
+                return
+            batch = [item]
+            # Group commit: take whatever else queued up while the last batch was being
+            # committed (optionally waiting batch_window seconds for more), up to batch_max
+            deadline = time.monotonic() + self.batch_window
+            stop = False
+            while len(batch) < self.batch_max:
+                try:
+                    item = self._writes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            results = []
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+                for op, fut in batch:
+                    # A failing op only rolls back itself, not the rest of the batch
+                    cur.execute("SAVEPOINT op")
+                    try:
+                        results.append((op(cur), None))
+                        cur.execute("RELEASE op")
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO op")
+                        cur.execute("RELEASE op")
+                        results.append((None, e))
+                self.conn.commit()
+            except Exception as e:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                results = [(None, e)] * len(batch)
+            # Only now, after COMMIT, do callers learn the outcome
+            for (op, fut), (value, error) in zip(batch, results):
+                if error is not None:
+                    fut.set_exception(error)
+                else:
+                    fut.set_result(value)
+            if stop:
+                return
 
     def create_table(self):
         self.cursor.execute("""
@@ -28,86 +172,551 @@ class Database:
             )
         """)
         self.conn.commit()
+        self.migrate()
+
+    def schema_version(self):
+        # The writer's cursor is only safe to use before the writer thread starts
+        if hasattr(self, "_local"):
+            return self._reader().execute("PRAGMA user_version").fetchone()[0]
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+
+    def migrate(self):
+        # Apply pending migrations one version at a time, each in its own transaction,
+        # so an old attendance.db keeps its rows and is upgraded in place.
+        # The GUI, API and CLI tools may open the same old file at once: each step takes
+        # the write lock first (BEGIN IMMEDIATE) and re-reads the version under it, so a
+        # step another process has just applied is skipped instead of run twice.
+        version = self.schema_version()
+        for target, step in enumerate(self.MIGRATIONS, start=1):
+            if version >= target:
+                continue
+            try:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+                if version >= target:
+                    self.conn.rollback()
+                    continue
+                step(self)
+                self.cursor.execute(f"PRAGMA user_version = {target}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            version = target
+
+    def _migrate_v1(self):
+        # Split the check-in day out of date_time and keep an epoch timestamp,
+        # so lookups by day can use an index instead of LIKE over TEXT.
+        self.cursor.execute("ALTER TABLE attendance ADD COLUMN day TEXT")
+        self.cursor.execute("ALTER TABLE attendance ADD COLUMN ts INTEGER")
+        self.cursor.execute("""
+            UPDATE attendance
+            SET day = substr(date_time, 1, 10),
+                ts = CAST(strftime('%s', date_time, 'utc') AS INTEGER)
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_attendance_student_course_day
+            ON attendance (student_id, course_code, day)
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_attendance_day_course
+            ON attendance (day, course_code)
+        """)
+
+    def _migrate_v2(self):
+        # One check-in per student/course/day is now enforced by the schema itself.
+        # Keep the earliest row of any duplicates that slipped in before the constraint.
+        self.cursor.execute("""
+            DELETE FROM attendance WHERE id NOT IN (
+                SELECT MIN(id) FROM attendance GROUP BY student_id, course_code, day
+            )
+        """)
+        self.cursor.execute("DROP INDEX IF EXISTS idx_attendance_student_course_day")
+        self.cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_student_course_day
+            ON attendance (student_id, course_code, day)
+        """)
+
+    def _migrate_v3(self):
+        # Lets a subject-filtered date range walk (course_code, day, id) in order for keyset paging
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_attendance_course_day
+            ON attendance (course_code, day)
+        """)
+
+    def _migrate_v4(self):
+        # Aggregates for the Stats tab, kept current by triggers so every write path
+        # (single check-in, bulk import, delete) updates them in the same transaction.
+        # agg_course_student.student_name is the name from the student's latest check-in.
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS agg_course_student (
+                course_code TEXT,
+                student_id TEXT,
+                student_name TEXT,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (course_code, student_id)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS agg_course_day (
+                course_code TEXT,
+                day TEXT,
+                room TEXT,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (course_code, day, room)
+            ) WITHOUT ROWID
+        """)
+        add = """
+            INSERT INTO agg_course_student (course_code, student_id, student_name, count)
+            VALUES (NEW.course_code, NEW.student_id, NEW.student_name, 1)
+            ON CONFLICT (course_code, student_id) DO UPDATE
+                SET count = count + 1, student_name = excluded.student_name;
+            INSERT INTO agg_course_day (course_code, day, room, count)
+            VALUES (NEW.course_code, NEW.day, NEW.room, 1)
+            ON CONFLICT (course_code, day, room) DO UPDATE SET count = count + 1;
+        """
+        remove = """
+            UPDATE agg_course_student SET count = count - 1
+            WHERE course_code = OLD.course_code AND student_id = OLD.student_id;
+            DELETE FROM agg_course_student
+            WHERE course_code = OLD.course_code AND student_id = OLD.student_id AND count <= 0;
+            UPDATE agg_course_day SET count = count - 1
+            WHERE course_code = OLD.course_code AND day = OLD.day AND room IS OLD.room;
+            DELETE FROM agg_course_day
+            WHERE course_code = OLD.course_code AND day = OLD.day AND room IS OLD.room AND count <= 0;
+        """
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_attendance_agg_insert AFTER INSERT ON attendance BEGIN {add} END")
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_attendance_agg_delete AFTER DELETE ON attendance BEGIN {remove} END")
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_attendance_agg_update
+            AFTER UPDATE OF student_id, student_name, course_code, room, day ON attendance
+            BEGIN {remove} {add} END
+        """)
+        # Backfill from existing rows
+        self.cursor.execute("""
+            INSERT INTO agg_course_student (course_code, student_id, student_name, count)
+            SELECT a.course_code, a.student_id,
+                   (SELECT l.student_name FROM attendance l
+                    WHERE l.course_code = a.course_code AND l.student_id = a.student_id
+                    ORDER BY l.id DESC LIMIT 1),
+                   COUNT(*)
+            FROM attendance a
+            GROUP BY a.course_code, a.student_id
+        """)
+        self.cursor.execute("""
+            INSERT INTO agg_course_day (course_code, day, room, count)
+            SELECT course_code, day, room, COUNT(*) FROM attendance GROUP BY course_code, day, room
+        """)
+
+    def _migrate_v5(self):
+        # Roster: names live in students, attendance rows only reference student_id.
+        # imported = 1 marks rows from a roster import (those are what scans are validated
+        # against); 0 is a name learned from a QR card.
+        # Seed students from each ID's latest check-in, then drop the duplicated names.
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS students (
+                student_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                imported INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS enrollments (
+                course_code TEXT,
+                student_id TEXT,
+                PRIMARY KEY (course_code, student_id)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            INSERT OR IGNORE INTO students (student_id, name)
+            SELECT student_id, student_name FROM attendance
+            WHERE id IN (SELECT MAX(id) FROM attendance WHERE student_name IS NOT NULL GROUP BY student_id)
+        """)
+        self.cursor.execute("UPDATE attendance SET student_name = NULL WHERE student_id IN (SELECT student_id FROM students)")
+
+    def _migrate_v6(self):
+        # Closed terms moved to archive files (see archive.py). Per-student totals now
+        # come from agg_course_student, which also counts archived rows.
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS terms (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                start_day TEXT NOT NULL,
+                end_day TEXT NOT NULL,
+                path TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                archived_at TEXT NOT NULL
+            )
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agg_course_student_student
+            ON agg_course_student (student_id)
+        """)
+
+    MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5, _migrate_v6]
 
     def add_subject(self, name):
         try:
-            self.cursor.execute("INSERT INTO subjects (name) VALUES (?)", (name,))
-            self.conn.commit()
+            self._write(lambda cur: cur.execute("INSERT INTO subjects (name) VALUES (?)", (name,)))
             return True
         except:
             return False
 
     def delete_subject(self, name):
         try:
-            self.cursor.execute("DELETE FROM subjects WHERE name = ?", (name,))
-            self.conn.commit()
+            self._write(lambda cur: cur.execute("DELETE FROM subjects WHERE name = ?", (name,)))
             return True
         except:
             return False
 
     def get_subjects(self):
-        self.cursor.execute("SELECT name FROM subjects")
-        return [row[0] for row in self.cursor.fetchall()]
+        cur = self._reader().execute("SELECT name FROM subjects")
+        return [row[0] for row in cur.fetchall()]
 
     def delete_attendance(self, record_id):
+        # False if the row is not in the live table (archived terms are read-only)
         try:
-            self.cursor.execute("DELETE FROM attendance WHERE id = ?", (record_id,))
-            self.conn.commit()
-            return True
+            return self._write(lambda cur: cur.execute("DELETE FROM attendance WHERE id = ?", (record_id,)).rowcount) > 0
         except:
             return False
 
     def get_subject_stats(self, course_code):
         # Returns [ (student_name, count) ] ordered by count desc
         if not course_code: return []
-        self.cursor.execute("""
-            SELECT student_name, COUNT(*) as c 
-            FROM attendance 
-            WHERE course_code = ? 
-            GROUP BY student_id 
-            ORDER BY c DESC
+        # Read from the trigger-maintained aggregate instead of grouping the whole table
+        cur = self._reader().execute("""
+            SELECT COALESCE(s.name, g.student_name, g.student_id), g.count
+            FROM agg_course_student g
+            LEFT JOIN students s ON s.student_id = g.student_id
+            WHERE g.course_code = ?
+            ORDER BY g.count DESC, g.student_id
         """, (course_code,))
-        return self.cursor.fetchall()
+        return cur.fetchall()
 
-    def check_duplicate(self, student_id, course_code, date_str):
-        # Check if this student has already checked in for this course on this date (ignoring time for simplicity, or just duplicate record)
-        # We'll check if a record exists for this student_id and course_code on the same "date" part of date_time
-        query = "SELECT * FROM attendance WHERE student_id = ? AND course_code = ? AND date_time LIKE ?"
-        self.cursor.execute(query, (student_id, course_code, f"{date_str}%"))
-        return self.cursor.fetchone() is not None
+    def get_course_daily_counts(self, course_code):
+        # Returns [ (day, count) ] oldest first
+        if not course_code: return []
+        cur = self._reader().execute("""
+            SELECT day, SUM(count) FROM agg_course_day
+            WHERE course_code = ?
+            GROUP BY day ORDER BY day
+        """, (course_code,))
+        return cur.fetchall()
 
-    def save_attendance(self, student_id, student_name, course_code, room):
-        now = datetime.now()
+    def get_course_room_day_counts(self, course_code):
+        # Returns [ (room, day, count) ]
+        if not course_code: return []
+        cur = self._reader().execute("""
+            SELECT room, day, count FROM agg_course_day
+            WHERE course_code = ?
+            ORDER BY room, day
+        """, (course_code,))
+        return cur.fetchall()
+
+    def get_student_name(self, student_id):
+        row = self._reader().execute("SELECT name FROM students WHERE student_id = ?", (student_id,)).fetchone()
+        return row[0] if row else None
+
+    def remember_students(self, pairs):
+        # [(student_id, name)] for students outside the imported roster (roster names are left alone)
+        self._write(lambda cur: cur.executemany("""
+            INSERT INTO students (student_id, name) VALUES (?, ?)
+            ON CONFLICT (student_id) DO UPDATE SET name = excluded.name WHERE imported = 0
+        """, pairs))
+
+    def _remember_student(self, cur, student_id, student_name):
+        # Students scanned without a roster still get a name; roster entries win
+        if student_name:
+            cur.execute("INSERT OR IGNORE INTO students (student_id, name) VALUES (?, ?)", (student_id, student_name))
+
+    # --- roster ---
+    def add_roster_listener(self, cb):
+        # cb() is called after every roster change committed through this Database
+        self._roster_listeners.append(cb)
+
+    def import_roster(self, rows):
+        # rows: [(student_id, name, course_code or None)], all in one transaction.
+        # Existing students are renamed; enrollments are added, never removed.
+        def op(cur):
+            cur.executemany("""
+                INSERT INTO students (student_id, name, imported) VALUES (?, ?, 1)
+                ON CONFLICT (student_id) DO UPDATE SET name = excluded.name, imported = 1
+            """, [(sid, name) for sid, name, _ in rows])
+            cur.executemany("INSERT OR IGNORE INTO enrollments (course_code, student_id) VALUES (?, ?)",
+                            [(course, sid) for sid, _, course in rows if course])
+            return len(rows)
+
+        n = self._write(op)
+        for cb in list(self._roster_listeners):
+            cb()
+        return n
+
+    def get_roster(self):
+        # [(student_id, name)] of imported students
+        cur = self._reader().execute("SELECT student_id, name FROM students WHERE imported = 1")
+        return cur.fetchall()
+
+    def get_enrollments(self):
+        # [(course_code, student_id)]
+        cur = self._reader().execute("SELECT course_code, student_id FROM enrollments")
+        return cur.fetchall()
+
+    def save_attendance(self, student_id, student_name, course_code, room, when=None):
+        # when: datetime of the scan (defaults to now), e.g. from a recording
+        now = when or datetime.now()
         date_str = now.strftime("%Y-%m-%d")
         time_str = now.strftime("%H:%M:%S")
         full_datetime = f"{date_str} {time_str}"
 
-        if self.check_duplicate(student_id, course_code, date_str):
-            return False, "ເຊັກຊື່ຊ້ຳ (Duplicate Check-in)"
+        # Duplicates are dropped by the unique index, so a check-in is a single
+        # insert and two racing scans of the same card can't both succeed.
+        # Returns only once the writer has committed it.
+        def op(cur):
+            if self._archived_day(cur, date_str):
+                return None
+            self._remember_student(cur, student_id, student_name)
+            cur.execute("""
+                INSERT INTO attendance (student_id, course_code, room, date_time, day, ts)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (student_id, course_code, day) DO NOTHING
+            """, (student_id, course_code, room, full_datetime, date_str, int(now.timestamp())))
+            return cur.rowcount
 
         try:
-            self.cursor.execute("""
-                INSERT INTO attendance (student_id, student_name, course_code, room, date_time)
-                VALUES (?, ?, ?, ?, ?)
-            """, (student_id, student_name, course_code, room, full_datetime))
-            self.conn.commit()
+            with metrics.timer("db_save"):
+                inserted = self._write(op)
+            if inserted is None:
+                return False, ARCHIVED_TERM
+            if inserted == 0:
+                return False, "ເຊັກຊື່ຊ້ຳ (Duplicate Check-in)"
             return True, f"ເຊັກຊື່ສຳເລັດເວລາ {time_str}"
         except Exception as e:
             return False, str(e)
 
+    @staticmethod
+    def _archived_day(cur, day):
+        # The unique index only covers the live table, so a backdated row (replay of an old
+        # recording) inside an archived term would duplicate an archived check-in
+        return cur.execute("SELECT 1 FROM terms WHERE start_day <= ? AND end_day >= ? LIMIT 1", (day, day)).fetchone() is not None
+
+    def save_attendance_bulk(self, records, course_code, room):
+        # records: [(student_id, student_name or None[, datetime])]; rows without a
+        # datetime are stamped now. All rows go in one transaction; returns one result
+        # per record: True if saved, False if a duplicate, None if its day is in an
+        # archived term (read-only, see ARCHIVED_TERM).
+        now = datetime.now()
+        def op(cur):
+            results = []
+            archived = {}
+            for student_id, student_name, *when in records:
+                at = when[0] if when else now
+                day = at.strftime("%Y-%m-%d")
+                if day not in archived:
+                    archived[day] = self._archived_day(cur, day)
+                if archived[day]:
+                    results.append(None)
+                    continue
+                self._remember_student(cur, student_id, student_name)
+                cur.execute("""
+                    INSERT INTO attendance (student_id, course_code, room, date_time, day, ts)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (student_id, course_code, day) DO NOTHING
+                """, (student_id, course_code, room, at.strftime("%Y-%m-%d %H:%M:%S"),
+                      day, int(at.timestamp())))
+                results.append(cur.rowcount == 1)
+            return results
+
+        return self._write(op)
+
+    def _sources(self, start_day, end_day):
+        # Live table plus the archives of closed terms overlapping the range
+        return archive.sources(self._reader(), start_day, end_day)
+
     def get_attendance_by_date(self, date_str, subject=None):
+        # Rows keep the original (id, student_id, student_name, course_code, room, date_time) shape
+        cols = f"a.id, a.student_id, {NAME_SQL}, a.course_code, a.room, a.date_time"
+        where, params = self._range_filter(date_str, date_str, subject)
+        rows, params = archive.union(self._sources(date_str, date_str), f"""
+            SELECT id, student_id, student_name, course_code, room, date_time FROM {{table}} WHERE {where}
+        """, params)
+        cur = self._reader().execute(f"""
+            SELECT {cols} FROM ({rows}) a
+            LEFT JOIN students s ON s.student_id = a.student_id
+            ORDER BY a.id
+        """, params)
+        return cur.fetchall()
+
+    def get_attendance_with_totals(self, date_str, subject=None):
+        # Same rows as get_attendance_by_date plus each student's all-time check-in count,
+        # in one query. Totals come from agg_course_student, so they include archived terms.
+        where, params = self._range_filter(date_str, date_str, subject)
+        rows, params = archive.union(self._sources(date_str, date_str), f"""
+            SELECT id, student_id, student_name, course_code, room, date_time FROM {{table}} WHERE {where}
+        """, params)
+        cur = self._reader().execute(f"""
+            SELECT a.id, a.student_id, {NAME_SQL}, a.course_code, a.room, a.date_time, {TOTAL_SQL}
+            FROM ({rows}) a
+            LEFT JOIN students s ON s.student_id = a.student_id
+            ORDER BY a.id
+        """, params)
+        return cur.fetchall()
+
+    def _range_filter(self, start_day, end_day, subject):
+        where = "day >= ? AND day <= ?"
+        params = [start_day, end_day]
         if subject:
-            self.cursor.execute("SELECT * FROM attendance WHERE date_time LIKE ? AND course_code = ?", (f"{date_str}%", subject))
-        else:
-            self.cursor.execute("SELECT * FROM attendance WHERE date_time LIKE ?", (f"{date_str}%",))
-        return self.cursor.fetchall()
+            where += " AND course_code = ?"
+            params.append(subject)
+        return where, params
+
+    def count_attendance(self, start_day, end_day, subject=None):
+        where, params = self._range_filter(start_day, end_day, subject)
+        counts, params = archive.union(self._sources(start_day, end_day),
+                                       f"SELECT COUNT(*) AS n FROM {{table}} WHERE {where}", params)
+        cur = self._reader().execute(f"SELECT SUM(n) FROM ({counts})", params)
+        return cur.fetchone()[0]
+
+    def get_attendance_page(self, start_day, end_day, subject=None, after=None, before=None, limit=100):
+        # Keyset pagination over (day, course_code, id) between two days (inclusive).
+        # after/before are page_key() values of the last/first row of the neighbouring page;
+        # the key's day is also used as a range bound so deep pages seek instead of scanning.
+        # Rows: (id, std_id, name, course, room, date_time, total check-ins)
+        if after is not None:
+            start_day = max(start_day, after[0])
+        if before is not None:
+            end_day = min(end_day, before[0])
+        where, params = self._range_filter(start_day, end_day, subject)
+        order = "day, course_code, id"
+        if after is not None:
+            where += " AND (day, course_code, id) > (?, ?, ?)"
+            params.extend(after)
+        elif before is not None:
+            where += " AND (day, course_code, id) < (?, ?, ?)"
+            params.extend(before)
+            order = "day DESC, course_code DESC, id DESC"
+        # Each source returns its own first `limit` rows; the merged page keeps the first `limit`
+        rows, params = archive.union(self._sources(start_day, end_day), f"""
+            SELECT id, student_id, student_name, course_code, room, date_time, day
+            FROM {{table}}
+            WHERE {where}
+            ORDER BY {order}
+            LIMIT ?
+        """, params + [limit])
+        cur = self._reader().execute(f"""
+            WITH page AS (
+                SELECT * FROM ({rows}) ORDER BY {order} LIMIT ?
+            )
+            SELECT a.id, a.student_id, {NAME_SQL}, a.course_code, a.room, a.date_time, {TOTAL_SQL}
+            FROM page a
+            LEFT JOIN students s ON s.student_id = a.student_id
+            ORDER BY a.day, a.course_code, a.id
+        """, params + [limit])
+        return cur.fetchall()
 
     def get_student_stats(self, student_id):
-        self.cursor.execute("SELECT COUNT(*) FROM attendance WHERE student_id = ?", (student_id,))
-        return self.cursor.fetchone()[0]
+        # Served by agg_course_student, so archived terms are included
+        cur = self._reader().execute("SELECT COALESCE(SUM(count), 0) FROM agg_course_student WHERE student_id = ?", (student_id,))
+        return cur.fetchone()[0]
+
+    # --- terms / archives ---
+    def get_terms(self):
+        # [(name, start_day, end_day, path, rows, archived_at)] oldest first
+        cur = self._reader().execute("SELECT name, start_day, end_day, path, rows, archived_at FROM terms ORDER BY start_day")
+        return cur.fetchall()
+
+    def archive_term(self, term, start_day, end_day, path=None):
+        # Moves the term's rows into their own SQLite file and records it in terms.
+        # Aggregates keep the archived counts. Returns the number of rows moved.
+        if self._temp:
+            raise ValueError("An in-memory database can't be archived")
+        for day in (start_day, end_day):
+            datetime.strptime(day, "%Y-%m-%d")
+        if start_day > end_day:
+            raise ValueError("Term starts after it ends")
+        if end_day >= datetime.now().strftime("%Y-%m-%d"):
+            raise ValueError("Only closed terms (ending before today) can be archived")
+        reader = self._reader()
+        overlap = archive.overlapping_terms(reader, start_day, end_day)
+        if overlap:
+            raise ValueError(f"Overlaps archived term {overlap[0][1]}")
+        path = path or archive.archive_path(self.db_name, term)
+        if os.path.exists(path):
+            raise ValueError(f"Archive file already exists: {path}")
+
+        # Copy first (readers only), then delete exactly the copied rows in one write
+        # transaction and check nothing else is left in the range. A row deleted (or
+        # a backdated one inserted) in the range meanwhile rolls the move back; matching
+        # on more than the id covers a deleted row whose id was reused. The archive file
+        # is removed on failure.
+        copied = archive.copy_term(reader, path, start_day, end_day)
+        rel = os.path.relpath(os.path.abspath(path), os.path.dirname(os.path.abspath(self.db_name)))
+
+        def op(cur):
+            # Drop the aggregate delete trigger for this transaction only, so the
+            # aggregates keep counting the moved rows
+            trigger = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_attendance_agg_delete'").fetchone()[0]
+            cur.execute("DROP TRIGGER trg_attendance_agg_delete")
+            cur.executemany("DELETE FROM attendance WHERE id = ? AND student_id = ? AND course_code = ? AND ts = ?", copied)
+            deleted = cur.rowcount
+            left = cur.execute("SELECT COUNT(*) FROM attendance WHERE day >= ? AND day <= ?",
+                               (start_day, end_day)).fetchone()[0]
+            if deleted != len(copied) or left:
+                raise RuntimeError(f"Rows changed while archiving {term} ({len(copied) - deleted} removed, "
+                                   f"{left} added); try again")
+            cur.execute(trigger)
+            cur.execute("""
+                INSERT INTO terms (name, start_day, end_day, path, rows, archived_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (term, start_day, end_day, rel, len(copied), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+        try:
+            self._write(op)
+        except BaseException:
+            os.remove(path)
+            raise
+        return len(copied)
+
+    def compact(self):
+        # VACUUM can't run inside the writer's transactions, so it gets its own connection
+        # (busy_timeout waits out a batch in flight). Returns (bytes before, bytes after).
+        if self._temp:
+            return 0, 0
+        size = lambda: sum(os.path.getsize(self.db_name + ext) for ext in ("", "-wal") if os.path.exists(self.db_name + ext))
+        before = size()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+            conn.execute("REINDEX")
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+        return before, size()
 
     def close(self):
+        # Pending writes are committed before the writer exits; later writes raise
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._writes.put(None)
+        self._writer.join()
+        with self._readers_lock:
+            readers = list(self._readers)
+            self._readers.clear()
+        for conn in readers:
+            conn.close()
         self.conn.close()
+        if self._temp:
+            for ext in ("", "-wal", "-shm"):
+                if os.path.exists(self._temp + ext):
+                    os.remove(self._temp + ext)
+
+def page_key(row):
+    # Keyset position of an attendance row (id, std_id, name, course, room, date_time, ...)
+    return (row[5][:10], row[3], row[0])
 
 def generate_qr_image(data):
     # Create QR Code
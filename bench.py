@@ -0,0 +1,484 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+from backend import Database, generate_qr_image
+
+# Reproducible benchmarks for the scan/check-in/history hot paths.
+#   python bench.py --out bench_results.json
+#   python bench.py --only db --sizes 10000,100000
+#   python bench.py --only api --checkins 2000
+#   python bench.py --only enhance --corpus-dir qr_corpus
+# Results are JSON so runs can be diffed over time.
+
+COURSES = ["Math", "English", "Physics", "Python", "Database"]
+
+
+def percentiles(samples):
+    # samples in seconds -> summary in ms
+    if not samples:
+        return {}
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] * 1000.0
+    return {
+        "n": len(s),
+        "mean_ms": statistics.fmean(s) * 1000.0,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": s[-1] * 1000.0,
+    }
+
+
+def make_payloads(n, seed=0):
+    rng = random.Random(seed)
+    return [f"{100000 + i}|Student {rng.randint(0, 99999)}" for i in range(n)]
+
+
+def qr_gray(payload):
+    img = generate_qr_image(payload).convert("L")
+    return np.array(img)
+
+
+def render_frame(codes, rng, size=(480, 640), noise=8.0, blur=1, min_px=90, max_px=200):
+    # Paste QR codes at random positions/sizes onto a mid-grey "scene",
+    # then add sensor noise and defocus blur like a webcam frame.
+    h, w = size
+    frame = np.full((h, w), 120, np.uint8)
+    frame += rng.integers(0, 40, size=(h, w), dtype=np.uint8)
+    slot_w = w // max(1, len(codes))
+    for i, code in enumerate(codes):
+        px = int(rng.integers(min_px, min(max_px, slot_w, h) + 1))
+        tile = cv2.resize(code, (px, px), interpolation=cv2.INTER_AREA)
+        x = i * slot_w + int(rng.integers(0, max(1, slot_w - px)))
+        y = int(rng.integers(0, max(1, h - px)))
+        frame[y:y + px, x:x + px] = tile
+    if blur:
+        k = 2 * blur + 1
+        frame = cv2.GaussianBlur(frame, (k, k), 0)
+    if noise:
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def make_frames(n_frames, codes_per_frame=(0, 1, 2, 3), seed=0, **render_kwargs):
+    # Returns [(frame, set(expected payloads))]
+    rng = np.random.default_rng(seed)
+    payloads = make_payloads(64, seed)
+    cache = {}
+    frames = []
+    for i in range(n_frames):
+        k = codes_per_frame[i % len(codes_per_frame)]
+        chosen = [payloads[j] for j in rng.choice(len(payloads), size=k, replace=False)] if k else []
+        codes = [cache.setdefault(p, qr_gray(p)) for p in chosen]
+        frames.append((render_frame(codes, rng, **render_kwargs), set(chosen)))
+    return frames
+
+
+def bench_decode(n_frames=200, seed=0):
+    # Imported here so the database benchmarks still run on machines without libzbar
+    from pyzbar.pyzbar import decode
+    from decoding import FrameDecoder, SCANNER_MODES
+
+    frames = make_frames(n_frames, seed=seed)
+    results = {}
+
+    def run(name, fn):
+        latencies, found, expected = [], 0, 0
+        start = time.perf_counter()
+        for frame, want in frames:
+            t0 = time.perf_counter()
+            got = {obj.data.decode("utf-8") for obj in fn(frame)}
+            latencies.append(time.perf_counter() - t0)
+            found += len(got & want)
+            expected += len(want)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "frames_per_sec": len(frames) / elapsed,
+            "latency": percentiles(latencies),
+            "codes_found": found,
+            "codes_expected": expected,
+            "decode_rate": found / expected if expected else None,
+        }
+
+    run("pyzbar_bgr", decode)
+    for mode in SCANNER_MODES:
+        run(f"frame_decoder_{mode}", FrameDecoder(mode=mode).decode)
+    return results
+
+
+LAO_NAMES = ["ສົມສັກ ພົມມະວົງສາ", "ບຸນມີ ແສງສະຫວ່າງ", "ຄຳພອນ ວົງພະຈັນ", "ນາງ ມະນີວັນ ສີສຸວັນ", "ທອງລາ ອິນທະວົງ"]
+
+
+def bench_payload(n_frames=200, seed=0, min_px=60, max_px=140):
+    # Old "id|Lao name" byte-mode cards vs signed A1: alphanumeric cards, rendered
+    # small enough that QR version (module size) decides whether pyzbar can read them.
+    from pyzbar.pyzbar import decode
+    import qrpayload
+
+    with tempfile.TemporaryDirectory() as tmp:
+        key_path = os.path.join(tmp, "bench_key.bin")
+        rng = random.Random(seed)
+        ids = [f"{2021000000 + i}" for i in range(64)]
+        formats = {
+            "legacy": [f"{sid}|{rng.choice(LAO_NAMES)}" for sid in ids],
+            "signed": [qrpayload.encode_payload(sid, key_path=key_path) for sid in ids],
+        }
+        results = {}
+        for name, payloads in formats.items():
+            codes = {p: qr_gray(p) for p in payloads}
+            # generate_qr_image: 10 px per module, 4 module border, 17 + 4 * version modules
+            versions = [(c.shape[0] // 10 - 8 - 17) // 4 for c in codes.values()]
+            np_rng = np.random.default_rng(seed)
+            found = expected = 0
+            latencies = []
+            for i in range(n_frames):
+                chosen = [payloads[j] for j in np_rng.choice(len(payloads), size=1 + i % 3, replace=False)]
+                frame = render_frame([codes[p] for p in chosen], np_rng, min_px=min_px, max_px=max_px)
+                t0 = time.perf_counter()
+                got = {obj.data.decode("utf-8") for obj in decode(frame)}
+                latencies.append(time.perf_counter() - t0)
+                found += len(got & set(chosen))
+                expected += len(chosen)
+            results[name] = {
+                "payload_chars_mean": statistics.fmean(len(p) for p in payloads),
+                "qr_version_mean": statistics.fmean(versions),
+                "qr_version_max": max(versions),
+                "decode_latency": percentiles(latencies),
+                "decode_rate": found / expected if expected else None,
+            }
+
+        # Scan-path verification cost (key is loaded once and cached)
+        samples = formats["signed"] * 50
+        t0 = time.perf_counter()
+        for p in samples:
+            qrpayload.parse_payload(p, key_path)
+        results["verify_us"] = (time.perf_counter() - t0) / len(samples) * 1e6
+    return results
+
+
+# Hard-to-read scans the preprocessing tiers are meant to rescue
+DEGRADATIONS = ("clean", "dim", "glare", "blur", "small", "noise", "tilt")
+
+
+def degrade(code, kind, rng, size=(480, 640)):
+    # One generate_qr_image code on a textured scene, degraded like a hard real-world scan
+    h, w = size
+    frame = np.full((h, w), 120, np.float32) + rng.integers(0, 40, size=(h, w))
+    px = int(rng.integers(56, 72)) if kind == "small" else int(rng.integers(150, 230))
+    tile = cv2.resize(code, (px, px), interpolation=cv2.INTER_AREA).astype(np.float32)
+    if kind == "glare":
+        # Phone screen: washed-out code with a bright reflection across part of it
+        tile = 100 + tile * 0.55
+    x, y = int(rng.integers(20, w - px - 20)), int(rng.integers(20, h - px - 20))
+    frame[y:y + px, x:x + px] = tile
+    if kind == "tilt":
+        d = px * 0.22
+        src = np.float32([[x, y], [x + px, y], [x + px, y + px], [x, y + px]])
+        dst = src + np.float32(rng.uniform(-d, d, (4, 2)))
+        frame = cv2.warpPerspective(frame, cv2.getPerspectiveTransform(src, dst), (w, h), borderMode=cv2.BORDER_REPLICATE)
+    if kind == "glare":
+        yy, xx = np.mgrid[0:h, 0:w]
+        cx, cy = x + px * rng.uniform(0.3, 0.7), y + px * rng.uniform(0.3, 0.7)
+        frame += 110 * np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * (px * 0.35) ** 2))
+    if kind == "dim":
+        frame = 8 + frame * 0.14
+    k = {"blur": float(rng.uniform(1.6, 2.4)), "small": 0.6}.get(kind, 0.8)
+    frame = cv2.GaussianBlur(frame, (0, 0), k)
+    sigma = {"noise": 38.0, "dim": 2.0}.get(kind, 4.0)
+    frame += rng.normal(0, sigma, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def make_degraded_corpus(per_kind=30, seed=0):
+    # Labeled corpus: [(kind, payload, gray image)]
+    rng = np.random.default_rng(seed)
+    payloads = make_payloads(per_kind * len(DEGRADATIONS), seed)
+    corpus = []
+    for k, kind in enumerate(DEGRADATIONS):
+        for payload in payloads[k * per_kind:(k + 1) * per_kind]:
+            corpus.append((kind, payload, degrade(qr_gray(payload), kind, rng)))
+    return corpus
+
+
+def write_corpus(corpus, out_dir):
+    # PNGs plus labels.csv (file, degradation, payload), reusable as a regression set
+    import csv
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "labels.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["file", "degradation", "payload"])
+        for i, (kind, payload, img) in enumerate(corpus):
+            name = f"{kind}_{i:04d}.png"
+            cv2.imwrite(os.path.join(out_dir, name), img)
+            w.writerow([name, kind, payload])
+
+
+def bench_enhance(per_kind=30, seed=0, corpus_dir=None):
+    # Decode rate and cost of the plain decode and of each preprocessing tier on its own,
+    # per degradation, then of the escalating ladder (decoding.decode_image) as shipped.
+    from pyzbar.pyzbar import decode
+    from decoding import TIERS, FrameDecoder, decode_image, enhance
+    import metrics
+
+    corpus = make_degraded_corpus(per_kind, seed)
+    if corpus_dir:
+        write_corpus(corpus, corpus_dir)
+
+    def plain(gray):
+        return decode(gray)
+
+    def single(tier):
+        return lambda gray: decode(enhance(tier, gray)[0])
+
+    def run(fn, items):
+        latencies, ok = [], 0
+        for _, payload, img in items:
+            t0 = time.perf_counter()
+            got = {obj.data.decode("utf-8") for obj in fn(img)}
+            latencies.append(time.perf_counter() - t0)
+            ok += payload in got
+        return {"decode_rate": ok / len(items), "latency": percentiles(latencies)}
+
+    results = {}
+    for kind in DEGRADATIONS:
+        items = [c for c in corpus if c[0] == kind]
+        row = {"plain": run(plain, items)}
+        for tier in TIERS:
+            row[tier] = run(single(tier), items)
+        row["ladder"] = run(decode_image, items)
+        results[kind] = row
+    metrics.REGISTRY.reset()
+    results["all_ladder"] = run(decode_image, corpus)
+    # Which tier rescued the images the plain decode missed
+    results["ladder_hits_by_tier"] = {t: metrics.snapshot()["counters"].get(f"tier_{t}", {}).get("total", 0) for t in TIERS}
+    results["all_plain"] = run(plain, corpus)
+
+    # Live-video cost when no card is in view: the ladder runs on every Nth missed frame only
+    empty = [frame for frame, want in make_frames(60, codes_per_frame=(0,), seed=seed)]
+    for every in (0, 10, 1):
+        decoder = FrameDecoder(mode="roi", enhance_every=every)
+        for frame in empty:
+            decoder.decode(frame)
+        results[f"empty_frame_enhance_every_{every}_ms"] = decoder.avg_cost_ms
+    return results
+
+
+def prefill(path, rows, students=500):
+    # Bulk-load `rows` historical check-ins (distinct student/course/day) directly via sqlite
+    Database(path).close()
+    per_day = students * len(COURSES)
+    start = datetime.now() - timedelta(days=rows // per_day + 2)
+
+    def gen():
+        for i in range(rows):
+            day_i, rest = divmod(i, per_day)
+            course_i, sid = divmod(rest, students)
+            dt = start + timedelta(days=day_i, seconds=8 * 3600 + sid)
+            yield (f"S{sid:05d}", f"Student {sid}", COURSES[course_i], "101",
+                   dt.strftime("%Y-%m-%d %H:%M:%S"), dt.strftime("%Y-%m-%d"), int(dt.timestamp()))
+
+    conn = sqlite3.connect(path)
+    conn.executemany("""
+        INSERT INTO attendance (student_id, student_name, course_code, room, date_time, day, ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, gen())
+    conn.commit()
+    conn.close()
+    return (start + timedelta(days=max(0, (rows - 1) // per_day))).strftime("%Y-%m-%d")
+
+
+def bench_db(sizes, checkins=1000, queries=50):
+    results = {}
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            t0 = time.perf_counter()
+            busy_day = prefill(path, rows)
+            prefill_s = time.perf_counter() - t0
+            db = Database(path)
+
+            # Check-ins: new students today, plus the same students again (duplicates)
+            lat_new, lat_dup = [], []
+            for i in range(checkins):
+                t = time.perf_counter()
+                db.save_attendance(f"N{i:06d}", f"New {i}", COURSES[i % len(COURSES)], "101")
+                lat_new.append(time.perf_counter() - t)
+            for i in range(min(checkins, 200)):
+                t = time.perf_counter()
+                db.save_attendance(f"N{i:06d}", f"New {i}", COURSES[i % len(COURSES)], "101")
+                lat_dup.append(time.perf_counter() - t)
+
+            today = datetime.now().strftime("%Y-%m-%d")
+            q = {"by_date_all": [], "by_date_subject": [], "by_date_busy_day": [], "history_busy_day": [], "subject_stats": []}
+            for i in range(queries):
+                course = COURSES[i % len(COURSES)]
+                t = time.perf_counter(); db.get_attendance_by_date(today); q["by_date_all"].append(time.perf_counter() - t)
+                t = time.perf_counter(); db.get_attendance_by_date(today, subject=course); q["by_date_subject"].append(time.perf_counter() - t)
+                t = time.perf_counter(); db.get_attendance_by_date(busy_day); q["by_date_busy_day"].append(time.perf_counter() - t)
+                t = time.perf_counter(); db.get_attendance_with_totals(busy_day); q["history_busy_day"].append(time.perf_counter() - t)
+                t = time.perf_counter(); db.get_subject_stats(course); q["subject_stats"].append(time.perf_counter() - t)
+            db.close()
+
+            results[str(rows)] = {
+                "prefill_sec": prefill_s,
+                "checkins_per_sec": len(lat_new) / sum(lat_new),
+                "checkin_latency": percentiles(lat_new),
+                "duplicate_latency": percentiles(lat_dup),
+                "queries": {name: percentiles(v) for name, v in q.items()},
+            }
+    return results
+
+
+def bench_startup(runs=5):
+    # Cold-process import time of the GUI module (no window needed), plus time from
+    # ScanEngine.start_camera() to the first captured frame of a short video file.
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    imports = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", probe], cwd=here, capture_output=True, text=True, check=True)
+        imports.append(float(out.stdout.strip().splitlines()[-1]))
+
+    from engine import ScanEngine
+    first = []
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, "start.avi")
+        writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"MJPG"), 30, (640, 480))
+        for frame, _ in make_frames(10, seed=0):
+            writer.write(frame)
+        writer.release()
+        db = Database(os.path.join(tmp, "start.db"))
+        for _ in range(runs):
+            got = threading.Event()
+            engine = ScanEngine(db, on_frame=lambda f: got.set())
+            engine.start_session("Bench", "101")
+            t = time.perf_counter()
+            engine.start_camera(video)
+            got.wait(10)
+            first.append(time.perf_counter() - t)
+            engine.stop_session()
+        db.close()
+    return {"import_main": percentiles(imports), "first_frame": percentiles(first)}
+
+
+def bench_api(checkins=1000, clients=(1, 16, 64, 200), bulk=500):
+    # Local HTTP API under concurrent load: `clients` keep-alive connections each
+    # posting single check-ins, then one bulk request. Raw asyncio client, no deps.
+    import asyncio
+    from api import ApiServer
+
+    async def call(reader, writer, path, body):
+        data = json.dumps(body).encode("utf-8")
+        writer.write(f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+        await writer.drain()
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+        status = int(head.split()[1])
+        return status, json.loads(await reader.readexactly(length))
+
+    async def load(address, n_clients, course):
+        latencies, errors = [], 0
+
+        async def client(c):
+            nonlocal errors
+            reader, writer = await asyncio.open_connection(*address)
+            for i in range(c, checkins, n_clients):
+                t = time.perf_counter()
+                status, _ = await call(reader, writer, "/api/checkin",
+                                       {"course": course, "room": "101", "payload": f"H{i:06d}|Student {i}"})
+                latencies.append(time.perf_counter() - t)
+                errors += status != 200
+            writer.close()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(c) for c in range(n_clients)))
+        elapsed = time.perf_counter() - t0
+        return {"requests_per_sec": checkins / elapsed, "latency": percentiles(latencies), "errors": errors}
+
+    async def run_bulk(address):
+        reader, writer = await asyncio.open_connection(*address)
+        items = [f"B{i:06d}|Student {i}" for i in range(bulk)]
+        t = time.perf_counter()
+        status, out = await call(reader, writer, "/api/checkins", {"course": "Bulk", "room": "101", "items": items})
+        elapsed = time.perf_counter() - t
+        writer.close()
+        return {"items": bulk, "saved": out.get("saved"), "seconds": elapsed, "checkins_per_sec": bulk / elapsed}
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "api.db"))
+        server = ApiServer(db, key_path=os.path.join(tmp, "bench_key.bin")).start()
+        try:
+            for n in clients:
+                results[f"clients_{n}"] = asyncio.run(load(server.address, n, f"C{n}"))
+            results["bulk"] = asyncio.run(run_bulk(server.address))
+        finally:
+            server.stop()
+            db.close()
+    return results
+
+
+def git_rev():
+    try:
+        with os.popen("git rev-parse --short HEAD 2>/dev/null") as p:
+            return p.read().strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance benchmark suite")
+    parser.add_argument("--only", default="startup,decode,payload,enhance,db,api",
+                        help="comma list of: startup, decode, payload, enhance, db, api")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="existing rows for the db benchmark")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--checkins", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help="also write the degraded test images + labels.csv here")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    only = set(args.only.split(","))
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_rev": git_rev(),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "args": vars(args),
+        "results": {},
+    }
+    if "startup" in only:
+        report["results"]["startup"] = bench_startup()
+    if "decode" in only:
+        report["results"]["decode"] = bench_decode(args.frames, args.seed)
+    if "payload" in only:
+        report["results"]["payload"] = bench_payload(args.frames, args.seed)
+    if "enhance" in only:
+        report["results"]["enhance"] = bench_enhance(seed=args.seed, corpus_dir=args.corpus_dir)
+    if "db" in only:
+        sizes = [int(x) for x in args.sizes.split(",") if x]
+        report["results"]["db"] = bench_db(sizes, checkins=args.checkins)
+    if "api" in only:
+        report["results"]["api"] = bench_api(checkins=args.checkins)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report["results"], indent=2, ensure_ascii=False))
+    print(f"Saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
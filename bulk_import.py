@@ -0,0 +1,84 @@
+import io
+import os
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image
+from decoding import decode_image
+from roster import RosterIndex, resolve_checkin
+import qrpayload
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def list_images(path):
+    # Tasks are plain tuples so they can be shipped to worker processes:
+    # (file_path, None) for a folder, (zip_path, member) for a ZIP archive
+    if os.path.isdir(path):
+        tasks = []
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTS):
+                    tasks.append((os.path.join(root, name), None))
+        return tasks
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            return [(path, m) for m in zf.namelist() if m.lower().endswith(IMAGE_EXTS)]
+    raise ValueError(f"Not a folder or ZIP archive: {path}")
+
+
+def decode_image_task(task):
+    # Runs in a worker process. Returns (label, [payloads], error)
+    path, member = task
+    label = member or os.path.basename(path)
+    try:
+        if member is None:
+            img = Image.open(path)
+        else:
+            with zipfile.ZipFile(path) as zf:
+                img = Image.open(io.BytesIO(zf.read(member)))
+        payloads = [obj.data.decode("utf-8") for obj in decode_image(img)]
+        if not payloads:
+            return label, [], "No QR found"
+        return label, payloads, None
+    except Exception as e:
+        return label, [], str(e)
+
+
+def run_import(path, db, course, room, progress=None, workers=None, roster=None, key_path=qrpayload.KEY_FILE,
+               accept_legacy=True):
+    # Decode every image in parallel, then write all valid check-ins in one transaction.
+    # progress(done, total) is called from the calling thread as results arrive.
+    # Payloads are checked like a live scan (roster.resolve_checkin): unknown or unenrolled
+    # students, bad signatures and, without accept_legacy, plain cards are reported as failures.
+    roster = roster if roster is not None else RosterIndex(db)
+    tasks = list_images(path)
+    report = {"total": len(tasks), "saved": [], "duplicates": [], "failed": []}
+    records, sources = [], []
+    # spawn, not fork: the app forks from a process with running threads (Tk, db writer,
+    # camera) whose locks, e.g. the metrics registry's, could be copied held
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(decode_image_task, t) for t in tasks]
+        for done, fut in enumerate(as_completed(futures), start=1):
+            label, payloads, error = fut.result()
+            if error:
+                report["failed"].append((label, error))
+            for raw in payloads:
+                std_id, std_name, error = resolve_checkin(raw, course, roster, db, key_path, accept_legacy)
+                if error:
+                    report["failed"].append((label, f"{std_id}: {error}" if std_id else error))
+                    continue
+                records.append((std_id, std_name))
+                sources.append(label)
+            if progress:
+                progress(done, len(tasks))
+
+    from backend import ARCHIVED_TERM
+    saved = db.save_attendance_bulk(records, course, room) if records else []
+    for ok, (std_id, std_name), label in zip(saved, records, sources):
+        if ok is None:
+            report["failed"].append((label, f"{std_id}: {ARCHIVED_TERM}"))
+            continue
+        key = "saved" if ok else "duplicates"
+        report[key].append((label, f"{std_id} {std_name or ''}".strip()))
+    return report
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+from backend import generate_qr_image
+import roster
+import qrpayload
+
+# Batch QR card generation from a roster CSV:
+#   python cards.py roster.csv --pdf cards.pdf --png-dir sheets/
+# Cards carry signed A1: payloads (see qrpayload.py). QR images are cached on disk per
+# student ID and signing key, so re-runs only render new students.
+
+CACHE_DIR = "qr_cache"
+# Part of the cache key; bump when generate_qr_image output changes
+RENDER_VERSION = "h10b4"
+
+# A4 at 150 dpi, 3 x 4 cards per sheet
+DPI = 150
+PAGE_SIZE = (1240, 1754)
+GRID = (3, 4)
+MARGIN = 60
+QR_PX = 300
+PAGES_PER_PDF = 40
+
+# Lao-capable fonts first ("DokChampa" on Windows, Noto on Linux)
+FONT_CANDIDATES = [
+    "DokChampa.ttf", "C:/Windows/Fonts/DokChampa.ttf",
+    "NotoSansLao-Regular.ttf", "/usr/share/fonts/truetype/noto/NotoSansLao-Regular.ttf",
+    "DejaVuSans.ttf",
+]
+
+
+def student_payload(student_id, name, signed=True, key_path=qrpayload.KEY_FILE):
+    if signed:
+        return qrpayload.encode_payload(student_id, key_path=key_path)
+    return f"{student_id}|{name}"
+
+
+def read_roster(path):
+    # [(student_id, name)], one card per student
+    seen = {}
+    for sid, name, _ in roster.read_roster(path):
+        seen.setdefault(sid, name)
+    return list(seen.items())
+
+
+def cache_path(student_id, key_path=qrpayload.KEY_FILE, cache_dir=CACHE_DIR):
+    # The signed payload depends only on the ID and key (plus issue time, which a
+    # cached card simply keeps), so renames don't need a new QR
+    ident = f"{RENDER_VERSION}\0{qrpayload.PREFIX}\0{qrpayload.key_id(key_path)}\0{student_id}"
+    digest = hashlib.sha256(ident.encode("utf-8")).hexdigest()[:24]
+    return os.path.join(cache_dir, f"{digest}.png")
+
+
+def render_qr(task):
+    # Runs in a worker process; writes via a temp file so a killed run never leaves a half PNG
+    payload, path = task
+    img = generate_qr_image(payload).convert("L")
+    tmp = path + ".tmp"
+    img.save(tmp, format="PNG")
+    os.replace(tmp, path)
+    return path
+
+
+def build_cache(students, cache_dir=CACHE_DIR, workers=None, progress=None, key_path=qrpayload.KEY_FILE):
+    # Returns {student_id: cached png path}; only missing cards are signed and rendered
+    os.makedirs(cache_dir, exist_ok=True)
+    paths, todo = {}, []
+    for sid, name in students:
+        path = cache_path(sid, key_path, cache_dir)
+        paths[sid] = path
+        if not os.path.exists(path):
+            todo.append((student_payload(sid, name, key_path=key_path), path))
+    if todo:
+        # spawn, not fork: forking a threaded GUI process can copy held locks into workers
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for done, _ in enumerate(pool.map(render_qr, todo, chunksize=16), start=1):
+                if progress:
+                    progress(done, len(todo))
+    return paths, len(todo)
+
+
+def load_font(size):
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def iter_sheets(students, paths):
+    # Yields one page image at a time
+    cols, rows = GRID
+    per_page = cols * rows
+    cell_w = (PAGE_SIZE[0] - 2 * MARGIN) // cols
+    cell_h = (PAGE_SIZE[1] - 2 * MARGIN) // rows
+    font_name = load_font(28)
+    font_id = load_font(22)
+    for start in range(0, len(students), per_page):
+        page = Image.new("L", PAGE_SIZE, 255)
+        draw = ImageDraw.Draw(page)
+        for i, (sid, name) in enumerate(students[start:start + per_page]):
+            x = MARGIN + (i % cols) * cell_w
+            y = MARGIN + (i // cols) * cell_h
+            # Dashed-looking cut border
+            draw.rectangle([x + 4, y + 4, x + cell_w - 4, y + cell_h - 4], outline=180)
+            with Image.open(paths[sid]) as qr:
+                page.paste(qr.resize((QR_PX, QR_PX), Image.NEAREST), (x + (cell_w - QR_PX) // 2, y + 20))
+            ty = y + 30 + QR_PX
+            draw.text((x + cell_w // 2, ty), name, fill=0, font=font_name, anchor="ma")
+            draw.text((x + cell_w // 2, ty + 40), sid, fill=60, font=font_id, anchor="ma")
+        yield page
+
+
+def write_outputs(students, paths, pdf_path=None, png_dir=None):
+    # PNG sheets are written as they are drawn; PDFs are split every PAGES_PER_PDF pages
+    # (cards.pdf, cards-2.pdf, ...) so memory stays bounded for big rosters.
+    if png_dir:
+        os.makedirs(png_dir, exist_ok=True)
+    written, batch, pdfs = [], [], []
+
+    def flush_pdf():
+        if not batch: return
+        base, ext = os.path.splitext(pdf_path)
+        out = pdf_path if not pdfs else f"{base}-{len(pdfs) + 1}{ext}"
+        batch[0].save(out, save_all=True, append_images=batch[1:], resolution=DPI)
+        pdfs.append(out)
+        written.append(out)
+        batch.clear()
+
+    for n, page in enumerate(iter_sheets(students, paths), start=1):
+        if png_dir:
+            out = os.path.join(png_dir, f"sheet_{n:03d}.png")
+            page.save(out, dpi=(DPI, DPI))
+            written.append(out)
+        if pdf_path:
+            batch.append(page)
+            if len(batch) == PAGES_PER_PDF:
+                flush_pdf()
+    if pdf_path:
+        flush_pdf()
+    return written
+
+
+def generate_cards(roster_csv, pdf_path=None, png_dir=None, cache_dir=CACHE_DIR, workers=None, progress=None,
+                   key_path=qrpayload.KEY_FILE):
+    # Returns (number of students, number of QR codes actually rendered, files written)
+    students = read_roster(roster_csv)
+    paths, rendered = build_cache(students, cache_dir, workers, progress, key_path)
+    files = write_outputs(students, paths, pdf_path, png_dir)
+    return len(students), rendered, files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render printable QR cards from a roster CSV")
+    parser.add_argument("roster")
+    parser.add_argument("--pdf", help="output PDF (split every %d pages)" % PAGES_PER_PDF)
+    parser.add_argument("--png-dir", help="folder for PNG sheets")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--key", default=qrpayload.KEY_FILE, help="signing key (created if missing)")
+    args = parser.parse_args(argv)
+    if not args.pdf and not args.png_dir:
+        parser.error("give --pdf and/or --png-dir")
+    n, rendered, files = generate_cards(args.roster, args.pdf, args.png_dir, args.cache_dir, args.workers,
+                                        key_path=args.key)
+    print(f"{n} students, {rendered} QR codes rendered ({n - rendered} cached), {len(files)} files written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+from pyzbar.pyzbar import decode
+import metrics
+from pipeline import SCANNER_MODES
+
+# Escalation ladder for codes the plain grayscale decode misses, cheapest first:
+# local contrast (dim rooms), adaptive threshold (glare/uneven light on phone screens),
+# unsharp mask (defocus), then rescaling (codes too small, or too noisy at full size).
+TIERS = ("clahe", "threshold", "sharpen", "upscale", "downscale")
+# Whole live frames skip the rescaling tiers (upscale alone decodes 4x the pixels);
+# inside a tracked ROI the crop is small enough for the full ladder
+LIVE_TIERS = ("clahe", "threshold", "sharpen")
+# The upscale tier is for small codes in small images; a 12 MP phone photo doubled
+# would be ~48 MP of cubic resize plus decode for nothing, so larger images skip it
+MAX_UPSCALE_PIXELS = 2_000_000
+
+# cv2.CLAHE objects keep per-call state and are not safe to share, and enhance() runs on
+# the decode worker, API/upload threads and import workers at once: one per thread
+_local = threading.local()
+
+
+def _clahe():
+    clahe = getattr(_local, "clahe", None)
+    if clahe is None:
+        clahe = _local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe
+
+
+def enhance(tier, gray):
+    # Returns (image, scale of the image relative to gray)
+    if tier == "clahe":
+        return _clahe().apply(gray), 1.0
+    if tier == "threshold":
+        # Block of ~1/16 of the shorter side: a few modules wide for a code filling a quarter of it
+        block = max(11, min(gray.shape[:2]) // 16) | 1
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 5), 1.0
+    if tier == "sharpen":
+        blurred = cv2.GaussianBlur(gray, (0, 0), 3)
+        return cv2.addWeighted(gray, 1.8, blurred, -0.8, 0), 1.0
+    if tier == "upscale":
+        return cv2.resize(gray, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC), 2.0
+    if tier == "downscale":
+        return cv2.resize(gray, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA), 0.5
+    raise ValueError(f"Unknown preprocessing tier: {tier}")
+
+
+def decode_enhanced(gray, tiers=TIERS):
+    # Tries each tier until one decodes. Returns (found, tier, scale); ([], None, 1.0) if none did.
+    # Per-tier cost and hits are recorded as metrics "tier_<name>".
+    for tier in tiers:
+        if tier == "upscale" and gray.shape[0] * gray.shape[1] > MAX_UPSCALE_PIXELS:
+            continue
+        start = time.perf_counter()
+        img, scale = enhance(tier, gray)
+        found = decode(img)
+        metrics.observe(f"tier_{tier}", time.perf_counter() - start)
+        if found:
+            metrics.inc(f"tier_{tier}")
+            return found, tier, scale
+    return [], None, 1.0
+
+
+def to_gray(img):
+    # BGR/gray ndarray or PIL image -> 2-D uint8 array
+    if not isinstance(img, np.ndarray):
+        return np.asarray(img.convert("L"))
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def decode_image(img, tiers=TIERS):
+    # Still images (uploads, bulk import): plain decode first, then the whole ladder
+    gray = to_gray(img)
+    found = decode(gray)
+    if found:
+        return found
+    return decode_enhanced(gray, tiers)[0]
+
+
+class FrameDecoder:
+    def __init__(self, mode="roi", scale=0.5, pad=0.3, full_every=15, roi_ttl=10, enhance_every=10, tiers=LIVE_TIERS):
+        if mode not in SCANNER_MODES:
+            raise ValueError(f"Unknown scanner mode: {mode}")
+        self.mode = mode
+        self.scale = scale          # downscale factor for whole-frame attempts
+        self.pad = pad              # ROI padding, as a fraction of the tracked box size
+        self.full_every = full_every  # force a whole-frame pass every N frames
+        self.roi_ttl = roi_ttl      # drop the ROI after this many misses in a row
+        # Run the preprocessing ladder on at most every Nth missed frame (0 = never), so
+        # frames without any card in view keep costing one plain decode
+        self.enhance_every = enhance_every
+        self.tiers = tiers
+        self.enhanced = 0           # frames rescued by a preprocessing tier
+        self.roi = None             # (x0, y0, x1, y1) in full-frame pixels
+        self.roi_misses = 0
+        self.frames = 0
+        self.total_time = 0.0
+        self.last_cost = 0.0
+
+    def reset(self):
+        self.roi = None
+        self.roi_misses = 0
+
+    @property
+    def avg_cost_ms(self):
+        return 1000.0 * self.total_time / self.frames if self.frames else 0.0
+
+    def decode(self, frame):
+        # Returns pyzbar results; only .data is meaningful to callers since
+        # rect/polygon are relative to whichever sub-image was decoded.
+        start = time.perf_counter()
+        self.frames += 1
+        if self.mode == "full":
+            found = decode(frame)
+        else:
+            found = self._decode_roi(frame)
+        if not found and self.enhance_every and self.frames % self.enhance_every == 0:
+            found = self._decode_enhanced(frame)
+        self.last_cost = time.perf_counter() - start
+        self.total_time += self.last_cost
+        metrics.observe("decode", self.last_cost)
+        metrics.inc("decodes")
+        return found
+
+    def _decode_roi(self, frame):
+        if frame.ndim == 3:
+            with metrics.timer("convert"):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = frame
+        periodic = self.frames % self.full_every == 0
+
+        if self.roi is not None and not periodic:
+            x0, y0, x1, y1 = self.roi
+            found = decode(gray[y0:y1, x0:x1])
+            if found:
+                self.roi_misses = 0
+                self._track(found, gray.shape, 1.0, x0, y0)
+            else:
+                self.roi_misses += 1
+                if self.roi_misses > self.roi_ttl:
+                    self.reset()
+            return found
+
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        found = decode(small)
+        if found:
+            self._track(found, gray.shape, 1.0 / self.scale, 0, 0)
+            return found
+
+        # Small or distant codes may not survive downscaling; try full resolution now and then
+        if periodic:
+            found = decode(gray)
+            if found:
+                self._track(found, gray.shape, 1.0, 0, 0)
+            else:
+                self.reset()
+        return found
+
+    def _decode_enhanced(self, frame):
+        # Escalate inside the tracked ROI when there is one (a card was just seen), else full frame
+        gray = to_gray(frame)
+        x0 = y0 = 0
+        sub = gray
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            sub = gray[y0:y1, x0:x1]
+        found, tier, scale = decode_enhanced(sub, self.tiers if self.roi is None else TIERS)
+        if found:
+            self.enhanced += 1
+            if self.mode == "roi":
+                self._track(found, gray.shape, 1.0 / scale, x0, y0)
+        return found
+
+    def _track(self, found, shape, factor, off_x, off_y):
+        # ROI = union of all symbol rects, mapped back to full-frame pixels and padded
+        x0 = min(o.rect.left for o in found)
+        y0 = min(o.rect.top for o in found)
+        x1 = max(o.rect.left + o.rect.width for o in found)
+        y1 = max(o.rect.top + o.rect.height for o in found)
+        x0, x1 = off_x + x0 * factor, off_x + x1 * factor
+        y0, y1 = off_y + y0 * factor, off_y + y1 * factor
+        pad = self.pad * max(x1 - x0, y1 - y0)
+        h, w = shape[:2]
+        self.roi = (
+            max(0, int(x0 - pad)), max(0, int(y0 - pad)),
+            min(w, int(x1 + pad)), min(h, int(y1 + pad)),
+        )
+        self.roi_misses = 0
+
+
+def measure_decode_cost(frames, mode, **kwargs):
+    # Average decode cost in ms/frame and number of frames with at least one hit
+    decoder = FrameDecoder(mode=mode, **kwargs)
+    hits = 0
+    for frame in frames:
+        if decoder.decode(frame):
+            hits += 1
+    return decoder.avg_cost_ms, hits
+
+
+def read_frames(source, limit=300):
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+if __name__ == "__main__":
+    # python decoding.py <video file or camera index>
+    src = sys.argv[1] if len(sys.argv) > 1 else "0"
+    frames = read_frames(int(src) if src.isdigit() else src)
+    if not frames:
+        sys.exit(f"No frames read from {src}")
+    for mode in SCANNER_MODES:
+        ms, hits = measure_decode_cost(frames, mode)
+        print(f"{mode:>5}: {ms:.2f} ms/frame, {hits}/{len(frames)} frames decoded")
@@ -0,0 +1,394 @@
+import argparse
+import queue
+import threading
+import time
+from collections import namedtuple
+import cv2
+from PIL import Image
+from backend import Database
+from pipeline import LatestFrameQueue, RecentSeen
+from decoding import FrameDecoder, SCANNER_MODES, decode_image
+from roster import RosterIndex, resolve_checkin
+import qrpayload
+import metrics
+
+# Reopen a network stream after this many failed reads in a row
+STREAM_RETRY_READS = 50
+
+# One result per scanned payload. student_id/student_name are None when the payload is unreadable.
+CheckinEvent = namedtuple("CheckinEvent", "success student_id student_name message payload course room")
+
+
+def parse_source(text):
+    # "0" -> camera index 0; anything else (file path, rtsp://..., http://...) as is
+    text = str(text).strip()
+    return int(text) if text.isdigit() else text
+
+
+def is_live(source):
+    return isinstance(source, int) or "://" in source
+
+
+class ScanEngine:
+    # GUI-independent check-in engine: holds the course/room session, runs the
+    # capture -> decode -> persistence pipeline and reports every scan to callbacks.
+    # Callbacks run on worker threads; GUI clients must marshal to their own thread.
+    def __init__(self, db, scanner_mode=SCANNER_MODES[0], cooldown=3.0, on_checkin=None, on_frame=None, roster=None,
+                 accept_legacy=True, key_path=qrpayload.KEY_FILE):
+        self.db = db
+        # Signed cards are verified with key_path; plain "id|name" cards only while accept_legacy
+        self.accept_legacy = accept_legacy
+        self.key_path = key_path
+        # Scans are checked against the roster in memory before touching the database
+        self.roster = roster if roster is not None else RosterIndex(db)
+        self.scanner_mode = scanner_mode
+        self.checkin_callbacks = [on_checkin] if on_checkin else []
+        self.frame_callbacks = [on_frame] if on_frame else []
+
+        # Session
+        self.course = ""
+        self.room = ""
+
+        # Pipeline state
+        self.running = False
+        self.source = None
+        self.threads = []
+        self.frame_queue = LatestFrameQueue()
+        self.checkin_queue = queue.Queue()
+        self.recent_scans = RecentSeen(ttl=cooldown)
+        self.frame_decoder = None
+        self._capture_done = threading.Event()
+        self._decode_done = threading.Event()
+
+        # Counters for throughput reporting
+        self.frames = 0
+        self.checkins = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.started_at = None
+        self.last_event = None
+
+    # --- session ---
+    def start_session(self, course, room):
+        if not course or not room:
+            raise ValueError("course and room are required")
+        self.course = course
+        self.room = room
+        self.recent_scans.clear()
+
+    def stop_session(self):
+        self.stop_camera()
+        self.wait(timeout=1.0)
+        self.course = ""
+        self.room = ""
+
+    @property
+    def active(self):
+        return bool(self.course and self.room)
+
+    @property
+    def camera_running(self):
+        return self.running
+
+    # --- callbacks ---
+    def add_checkin_callback(self, cb):
+        self.checkin_callbacks.append(cb)
+
+    def add_frame_callback(self, cb):
+        self.frame_callbacks.append(cb)
+
+    def _emit(self, event):
+        self.last_event = event
+        for cb in self.checkin_callbacks:
+            try:
+                cb(event)
+            except Exception as e:
+                print(e)
+
+    # --- check-in ---
+    def handle_payload(self, data):
+        # Parse one signed or "id|name" payload and record it for the active session
+        with metrics.timer("checkin"):
+            return self._handle_payload(data)
+
+    def _handle_payload(self, data):
+        if not self.active:
+            event = CheckinEvent(False, None, None, "No active session", data, self.course, self.room)
+            self._emit(event)
+            return event
+        std_id, std_name, error = resolve_checkin(data, self.course, self.roster, self.db,
+                                                  self.key_path, self.accept_legacy)
+        if error:
+            self.rejected += 1
+            metrics.inc("rejected")
+            event = CheckinEvent(False, std_id, std_name, error, data, self.course, self.room)
+            self._emit(event)
+            return event
+        success, msg = self.db.save_attendance(std_id, std_name, self.course, self.room)
+        if success:
+            self.checkins += 1
+            metrics.inc("checkins")
+        else:
+            self.duplicates += 1
+            metrics.inc("duplicates")
+        event = CheckinEvent(success, std_id, std_name, msg, data, self.course, self.room)
+        self._emit(event)
+        return event
+
+    def feed_payloads(self, payloads):
+        # Apply the per-payload cooldown, then record synchronously
+        return [self.handle_payload(raw) for raw in payloads if self.recent_scans.check(raw)]
+
+    def feed_frame(self, frame):
+        # Synchronous decode of one BGR frame (no threads); returns the check-in events
+        if self.frame_decoder is None:
+            self.frame_decoder = FrameDecoder(mode=self.scanner_mode)
+        self.frames += 1
+        payloads = [obj.data.decode("utf-8") for obj in self.frame_decoder.decode(frame)]
+        return self.feed_payloads(payloads)
+
+    def feed_image(self, image):
+        # A file path or PIL image; every symbol in it is recorded (no cooldown).
+        # Photos get the full preprocessing ladder when the plain decode finds nothing.
+        img = Image.open(image) if isinstance(image, str) else image
+        return [self.handle_payload(obj.data.decode("utf-8")) for obj in decode_image(img)]
+
+    # --- camera pipeline ---
+    def start_camera(self, source=0):
+        # source: camera index, stream URL, or a video file path (every frame of a file is
+        # decoded, at decode speed; the pipeline ends at end of file)
+        if self.running: return
+        if not self.active:
+            raise RuntimeError("start_session() before start_camera()")
+        # Let the previous run's workers exit before starting new ones
+        self.wait(timeout=1.0)
+        self.running = True
+        self.source = source
+        self.frames = 0
+        self.frame_queue.clear()
+        self.frame_queue.dropped = 0
+        self.recent_scans.clear()
+        self.frame_decoder = FrameDecoder(mode=self.scanner_mode)
+        self._capture_done.clear()
+        self._decode_done.clear()
+        self.started_at = time.monotonic()
+        # Capture, decode and persistence each run on their own thread so a slow
+        # decode never stalls the preview and a slow commit never stalls decoding.
+        self.threads = [
+            threading.Thread(target=self.capture_loop, args=(source,), daemon=True),
+            threading.Thread(target=self.decode_loop, daemon=True),
+            threading.Thread(target=self.persist_loop, daemon=True),
+        ]
+        for t in self.threads:
+            t.start()
+
+    def stop_camera(self):
+        # The capture thread releases the device itself once it sees the flag
+        self.running = False
+
+    def wait(self, timeout=None):
+        for t in self.threads:
+            if t.is_alive():
+                t.join(timeout)
+
+    def capture_loop(self, source):
+        # Capture stage: runs at camera FPS (cap.read blocks until the next frame).
+        # A video file would be read far faster than it decodes, so there every frame
+        # waits for the decoder instead of replacing the previous one.
+        live = is_live(source)
+        # Local, not on self: a previous run still exiting must not release this run's device
+        cap = cv2.VideoCapture(source)
+        failures = 0
+        try:
+            while self.running:
+                start = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    if not live:
+                        break
+                    failures += 1
+                    if isinstance(source, str) and failures >= STREAM_RETRY_READS:
+                        # Dropped network stream: reconnect instead of spinning on a dead handle
+                        cap.release()
+                        time.sleep(0.5)
+                        cap = cv2.VideoCapture(source)
+                        failures = 0
+                    time.sleep(0.01)
+                    continue
+                failures = 0
+                metrics.observe("capture", time.perf_counter() - start)
+                metrics.inc("frames")
+                self.frames += 1
+                if live:
+                    dropped = self.frame_queue.dropped
+                    self.frame_queue.put(frame)
+                    if self.frame_queue.dropped != dropped:
+                        metrics.inc("frames_dropped")
+                else:
+                    while self.running and not self.frame_queue.put_wait(frame, timeout=0.1):
+                        pass
+                for cb in self.frame_callbacks:
+                    cb(frame)
+        finally:
+            cap.release()
+            self._capture_done.set()
+
+    def decode_loop(self):
+        # Decoder stage: always works on the newest frame, stale ones are dropped
+        try:
+            while True:
+                frame = self.frame_queue.get(timeout=0.1)
+                if frame is None:
+                    if not self.running:
+                        break
+                    if not self._capture_done.is_set():
+                        continue
+                    # Capture may have put its last frame just after the get above timed out
+                    frame = self.frame_queue.get(timeout=0)
+                    if frame is None:
+                        break
+                # Every code in the frame counts; only repeats of the same payload are suppressed
+                for obj in self.frame_decoder.decode(frame):
+                    raw = obj.data.decode("utf-8")
+                    if self.recent_scans.check(raw):
+                        self.checkin_queue.put(raw)
+        finally:
+            self._decode_done.set()
+
+    def persist_loop(self):
+        # Persistence stage: drains queued scans into SQLite, finishing any
+        # backlog after the camera is stopped
+        while True:
+            try:
+                raw = self.checkin_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._decode_done.is_set():
+                    break
+                continue
+            self.handle_payload(raw)
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "source": self.source,
+            "course": self.course,
+            "room": self.room,
+            "running": any(t.is_alive() for t in self.threads),
+            "frames": self.frames,
+            "fps": self.frames / elapsed if elapsed else 0.0,
+            "frames_dropped": self.frame_queue.dropped,
+            "checkins": self.checkins,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "decode_ms_avg": self.frame_decoder.avg_cost_ms if self.frame_decoder else 0.0,
+            "checkins_per_sec": self.checkins / elapsed if elapsed else 0.0,
+        }
+
+
+class SessionManager:
+    # Several ScanEngines scanning in parallel (one per entrance/camera), each with its
+    # own capture/decode/persist threads. They share the Database, whose single writer
+    # thread serialises their commits, and one RosterIndex.
+    def __init__(self, db, scanner_mode=SCANNER_MODES[0], on_checkin=None, **engine_kwargs):
+        self.db = db
+        self.scanner_mode = scanner_mode
+        self.on_checkin = on_checkin
+        self.engine_kwargs = engine_kwargs
+        roster = engine_kwargs.pop("roster", None)
+        # An empty RosterIndex is falsy (__len__); only build one when none was passed
+        self.roster = roster if roster is not None else RosterIndex(db)
+        self.engines = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def add(self, source, course, room, scanner_mode=None):
+        # Starts a session and returns its id
+        source = parse_source(source)
+        with self._lock:
+            for engine in self.engines.values():
+                if engine.running and engine.source == source:
+                    raise ValueError(f"Source already in use: {source}")
+            engine = ScanEngine(self.db, scanner_mode=scanner_mode or self.scanner_mode,
+                                on_checkin=self.on_checkin, roster=self.roster, **self.engine_kwargs)
+            engine.start_session(course, room)
+            engine.start_camera(source)
+            sid = self._next_id
+            self._next_id += 1
+            self.engines[sid] = engine
+        return sid
+
+    def stop(self, session_id):
+        with self._lock:
+            engine = self.engines.pop(session_id, None)
+        if engine:
+            engine.stop_session()
+
+    def stop_all(self):
+        for session_id in list(self.engines):
+            self.stop(session_id)
+
+    def __len__(self):
+        return len(self.engines)
+
+    def stats(self):
+        # [(session_id, stats dict)] in start order; "last" is the latest check-in message
+        rows = []
+        for session_id, engine in sorted(self.engines.items()):
+            st = engine.stats()
+            event = engine.last_event
+            st["last"] = f"{event.student_id or '-'}: {event.message}" if event else ""
+            rows.append((session_id, st))
+        return rows
+
+    def wait(self, timeout=None):
+        # Until every session's pipeline has finished (file sources end at EOF).
+        # Returns False if timeout ran out first.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(t.is_alive() for e in list(self.engines.values()) for t in e.threads):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.2)
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless QR attendance scanning session")
+    parser.add_argument("--course")
+    parser.add_argument("--room")
+    parser.add_argument("--source", default="0", help="camera index, stream URL or video file")
+    parser.add_argument("--mode", default=SCANNER_MODES[0], choices=SCANNER_MODES)
+    parser.add_argument("--db", default="attendance.db")
+    parser.add_argument("--key", default=qrpayload.KEY_FILE, help="signing key for A1: cards (copy of the one cards.py created)")
+    parser.add_argument("--signed-only", action="store_true", help="reject plain id|name cards")
+    parser.add_argument("--session", nargs=3, action="append", metavar=("SOURCE", "COURSE", "ROOM"),
+                        help="run several cameras/streams at once (repeatable)")
+    parser.add_argument("--metrics-out", help="write metrics here (.json, or .prom for Prometheus text)")
+    parser.add_argument("--metrics-every", type=float, default=10.0, help="seconds between metrics writes")
+    args = parser.parse_args(argv)
+    if not args.session and not (args.course and args.room):
+        parser.error("give --course and --room, or one or more --session")
+
+    def report(event):
+        mark = "✓" if event.success else "⚠"
+        print(f"{mark} [{event.course}@{event.room}] {event.student_id or '-'} {event.student_name or ''}: {event.message}", flush=True)
+
+    db = Database(args.db)
+    manager = SessionManager(db, scanner_mode=args.mode, on_checkin=report,
+                             accept_legacy=not args.signed_only, key_path=args.key)
+    for source, course, room in args.session or [(args.source, args.course, args.room)]:
+        manager.add(source, course, room)
+    try:
+        while not manager.wait(args.metrics_every if args.metrics_out else None):
+            metrics.dump(args.metrics_out)
+    except KeyboardInterrupt:
+        pass
+    stats = manager.stats()
+    manager.stop_all()
+    for session_id, st in stats:
+        print(session_id, st)
+    if args.metrics_out:
+        print(f"Metrics saved to {metrics.dump(args.metrics_out)}")
+    db.close()
+
+if __name__ == "__main__":
+    main()
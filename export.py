@@ -0,0 +1,190 @@
+import csv
+import os
+import sqlite3
+import threading
+import archive
+
+# Streaming export of attendance rows to CSV / Parquet / XLSX.
+# Rows are read from SQLite in keyset chunks on a private connection, so memory
+# stays bounded and no read lock is held across the whole export.
+
+EXPORT_COLUMNS = ["Student ID", "Name", "Course", "Room", "Date Time"]
+EXPORT_FORMATS = {".csv": "csv", ".xlsx": "xlsx", ".parquet": "parquet"}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def _filter(start_day, end_day, subjects):
+    where = "day >= ? AND day <= ?"
+    params = [start_day, end_day]
+    if subjects:
+        where += f" AND course_code IN ({','.join('?' * len(subjects))})"
+        params.extend(subjects)
+    return where, params
+
+
+def count_rows(conn, start_day, end_day, subjects=None):
+    where, params = _filter(start_day, end_day, subjects)
+    counts, params = archive.union(archive.sources(conn, start_day, end_day),
+                                   f"SELECT COUNT(*) AS n FROM {{table}} WHERE {where}", params)
+    return conn.execute(f"SELECT SUM(n) FROM ({counts})", params).fetchone()[0]
+
+
+def iter_chunks(conn, start_day, end_day, subjects=None, chunk=5000):
+    # Yields lists of (student_id, student_name, course_code, room, date_time),
+    # including rows of archived terms in the range
+    tables = archive.sources(conn, start_day, end_day)
+    key = None
+    while True:
+        lo = start_day if key is None else max(start_day, key[0])
+        where, params = _filter(lo, end_day, subjects)
+        if key is not None:
+            where += " AND (day, course_code, id) > (?, ?, ?)"
+            params.extend(key)
+        page, params = archive.union(tables, f"""
+            SELECT day, course_code, id, student_id, student_name, room, date_time
+            FROM {{table}}
+            WHERE {where}
+            ORDER BY day, course_code, id
+            LIMIT ?
+        """, params + [chunk])
+        rows = conn.execute(f"""
+            WITH page AS (
+                SELECT * FROM ({page}) ORDER BY day, course_code, id LIMIT ?
+            )
+            SELECT p.day, p.course_code, p.id, p.student_id, COALESCE(s.name, p.student_name, ''), p.room, p.date_time
+            FROM page p
+            LEFT JOIN students s ON s.student_id = p.student_id
+            ORDER BY p.day, p.course_code, p.id
+        """, params + [chunk]).fetchall()
+        if not rows:
+            return
+        key = rows[-1][:3]
+        yield [(r[3], r[4], r[1], r[5], r[6]) for r in rows]
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        # utf-8-sig so Excel opens Lao names correctly
+        self.f = open(path, "w", newline="", encoding="utf-8-sig")
+        self.w = csv.writer(self.f)
+        self.w.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self.w.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+
+class _XlsxWriter:
+    def __init__(self, path):
+        from openpyxl import Workbook
+        self.path = path
+        # write_only streams rows to disk instead of keeping every cell in memory
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet("Attendance")
+        self.ws.append(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        for r in rows:
+            self.ws.append(list(r))
+
+    def close(self):
+        self.wb.save(self.path)
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema([(c, pa.string()) for c in EXPORT_COLUMNS])
+        self.w = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        cols = list(zip(*rows))
+        self.w.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(c, type=self.pa.string()) for c in cols], schema=self.schema))
+
+    def close(self):
+        self.w.close()
+
+
+WRITERS = {"csv": _CsvWriter, "xlsx": _XlsxWriter, "parquet": _ParquetWriter}
+
+
+def export_format(path):
+    fmt = EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported export type: {path}")
+    return fmt
+
+
+def export_attendance(db_path, out_path, start_day, end_day, subjects=None,
+                      progress=None, cancel=None, chunk=5000):
+    # progress(done, total) after each chunk; cancel is a threading.Event.
+    # Returns the number of rows written. A cancelled or failed export leaves no file behind.
+    writer_cls = WRITERS[export_format(out_path)]
+    conn = sqlite3.connect(db_path)
+    writer = None
+    done = 0
+    try:
+        total = count_rows(conn, start_day, end_day, subjects)
+        writer = writer_cls(out_path)
+        for rows in iter_chunks(conn, start_day, end_day, subjects, chunk):
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled()
+            writer.write(rows)
+            done += len(rows)
+            if progress:
+                progress(done, total)
+        writer.close()
+        writer = None
+        return done
+    except BaseException:
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        raise
+    finally:
+        conn.close()
+
+
+class ExportJob:
+    # Runs export_attendance on a background thread. Callbacks run on that thread:
+    # on_progress(done, total), on_done(rows_written), on_error(exc) (ExportCancelled on cancel)
+    def __init__(self, db_path, out_path, start_day, end_day, subjects=None,
+                 on_progress=None, on_done=None, on_error=None):
+        self.args = (db_path, out_path, start_day, end_day, subjects)
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _run(self):
+        try:
+            n = export_attendance(*self.args, progress=self.on_progress, cancel=self.cancel_event)
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+            return
+        if self.on_done:
+            self.on_done(n)
@@ -1,15 +1,23 @@
+import time
+STARTUP_T0 = time.perf_counter()
+import importlib
+import json
+import os
+import sys
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
-import cv2
-from pyzbar.pyzbar import decode
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import threading
-import time
-from backend import Database, generate_qr_image
+from backend import Database, generate_qr_image, page_key
+from pipeline import SCANNER_MODES
+import cards
+import roster
+import metrics
+from export import ExportJob, ExportCancelled
 from datetime import datetime
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import pandas as pd
+# cv2/pyzbar (engine, preview, bulk_import, replay) and matplotlib are imported on
+# first use of the screen that needs them, and prewarmed in the background.
+STARTUP_IMPORTS_S = time.perf_counter() - STARTUP_T0
 
 # --- Configuration ---
 BG_COLOR = "#1e1e2e"
@@ -28,6 +36,33 @@ FONT_SUBHEADER = ("DokChampa", 16)
 FONT_BODY = ("DokChampa", 12)
 FONT_BUTTON = ("DokChampa", 12, "bold")
 
+# Stats chart types: key -> label
+STATS_CHARTS = {
+    "top": "Top 10 ນັກຮຽນ (Check-ins)",
+    "trend": "ແນວໂນ້ມລາຍວັນ (Daily trend)",
+    "rate": "ອັດຕາເຂົ້າຮຽນ (Rate %)",
+    "heatmap": "ຫ້ອງ x ວັນ (Room heatmap)",
+}
+
+# Camera preview redraw cap; decoding runs at camera rate regardless
+PREVIEW_FPS = 15
+
+# Sessions/Diagnostics dashboards: column key -> heading, refresh period
+SESSION_COLUMNS = {
+    "source": "Camera/URL", "course": "ວິຊາ", "room": "ຫ້ອງ", "status": "Status",
+    "fps": "FPS", "dropped": "Dropped", "checkins": "ເຊັກຊື່", "duplicates": "ຊ້ຳ",
+    "rejected": "ປະຕິເສດ", "per_min": "/ນາທີ", "last": "ລ່າສຸດ",
+}
+DASHBOARD_REFRESH_MS = 1000
+
+# Heavy modules loaded on a background thread once the window is up
+# (set ATTENDANCE_PREWARM=0 to disable)
+PREWARM_MODULES = ("engine", "preview", "matplotlib.figure", "matplotlib.backends.backend_tkagg")
+PREWARM_DELAY_MS = 300
+
+# Rows per History page
+HISTORY_PAGE_SIZE = 100
+
 class AttendanceApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -44,23 +79,74 @@ class AttendanceApp(tk.Tk):
 
         # State Variables
         self.current_mode = None
-        self.camera_running = False
-        self.cap = None
-        self.video_thread = None
-        self.last_scan_time = 0
-        self.scan_cooldown = 3.0
-        
-        # Session Variables
-        self.active_course = ""
-        self.active_room = ""
+
+        # Scanning session (course/room, camera pipeline) lives in the engine;
+        # the engine and extra entrance cameras (sessions) are created on first use
+        self.roster = roster.RosterIndex(self.db)
+        self._engine = None
+        self._sessions = None
+        self.camera_started_at = None
+        # Periodic redraw of the Sessions/Diagnostics screen
+        self.refresh_job = None
+        self.preview = None
         
-        # History filter
+        # History filter / pager
         self.history_filter_subject = None
+        self.history_range = None
+        self.history_total = 0
+        self.history_offset = 0
+        self.history_anchor = (None, None)
+        self.current_records = []
+
+        # Stats figure (created by show_stats_mode)
+        self.stats_fig = None
+        self.stats_canvas = None
+        self.stats_key = None
+        self.stats_artist = None
 
         self.setup_styles()
         self.create_layout()
         self.show_teacher_mode()
 
+        metrics.observe("startup_import", STARTUP_IMPORTS_S)
+        self.after_idle(self.on_window_ready)
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from engine import ScanEngine
+            self._engine = ScanEngine(self.db, on_checkin=self.on_checkin_event, on_frame=self.on_camera_frame,
+                                      roster=self.roster)
+        return self._engine
+
+    @property
+    def sessions(self):
+        # Extra entrance cameras; they keep scanning while other screens are open
+        if self._sessions is None:
+            from engine import SessionManager
+            self._sessions = SessionManager(self.db, roster=self.roster)
+        return self._sessions
+
+    def on_window_ready(self):
+        ready = time.perf_counter() - STARTUP_T0
+        metrics.observe("startup_window", ready)
+        if "--measure-startup" in sys.argv:
+            print(json.dumps({"imports_ms": STARTUP_IMPORTS_S * 1000, "window_ms": ready * 1000}))
+            self.destroy()
+            return
+        if os.environ.get("ATTENDANCE_PREWARM", "1") != "0":
+            self.after(PREWARM_DELAY_MS, lambda: threading.Thread(target=self.prewarm, daemon=True).start())
+
+    def prewarm(self):
+        # Import only; nothing here touches Tk
+        start = time.perf_counter()
+        for name in PREWARM_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                print(f"prewarm {name}: {e}")
+        metrics.observe("prewarm", time.perf_counter() - start)
+
     def setup_styles(self):
         style = ttk.Style()
         style.theme_use("clam")
@@ -91,15 +177,24 @@ class AttendanceApp(tk.Tk):
         title_lbl.pack()
 
         ttk.Button(self.sidebar, text="🎓 ໂຫມດອາຈານ (Scan)", style="Sidebar.TButton", command=self.show_teacher_mode).pack(fill="x", pady=10, ipady=10)
+        ttk.Button(self.sidebar, text="🎥 ຫຼາຍກ້ອງ (Sessions)", style="Sidebar.TButton", command=self.show_sessions_mode).pack(fill="x", pady=10, ipady=10)
         ttk.Button(self.sidebar, text="👨‍🎓 ໂຫມດນັກຮຽນ (QR)", style="Sidebar.TButton", command=self.show_student_mode).pack(fill="x", pady=10, ipady=10)
         ttk.Button(self.sidebar, text="📊 ປະຫວັດ (History)", style="Sidebar.TButton", command=self.show_history_mode).pack(fill="x", pady=10, ipady=10)
         ttk.Button(self.sidebar, text="📈 ສະຖິຕິ (Graph)", style="Sidebar.TButton", command=self.show_stats_mode).pack(fill="x", pady=10, ipady=10)
+        ttk.Button(self.sidebar, text="🩺 ວິເຄາະລະບົບ (Diagnostics)", style="Sidebar.TButton", command=self.show_diagnostics_mode).pack(fill="x", pady=10, ipady=10)
 
         self.content_area = ttk.Frame(self, style="Main.TFrame")
         self.content_area.pack(side="right", fill="both", expand=True)
 
     def clear_content(self):
         self.stop_camera()
+        self.close_stats_figure()
+        if self.refresh_job:
+            self.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        if self.preview:
+            self.preview.close()
+            self.preview = None
         for widget in self.content_area.winfo_children():
             widget.destroy()
 
@@ -139,6 +234,11 @@ class AttendanceApp(tk.Tk):
         btn_del_sub.pack(side="left", padx=5)
         
         self.create_label_entry(control_frame, "ຫ້ອງຮຽນ (Room):", "entry_room")
+
+        ttk.Label(control_frame, text="ໂຫມດສະແກນ (Scanner):", style="Body.TLabel").pack(anchor="w", pady=(15, 5))
+        self.combo_scanner = ttk.Combobox(control_frame, font=FONT_BODY, width=20, state="readonly", values=SCANNER_MODES)
+        self.combo_scanner.set(self._engine.scanner_mode if self._engine else SCANNER_MODES[0])
+        self.combo_scanner.pack(fill="x")
         
         # Actions
         self.btn_action = ttk.Button(control_frame, text="ເປີດກ້ອງ (Start Scan)", style="Action.TButton", command=self.toggle_camera_teacher)
@@ -146,6 +246,12 @@ class AttendanceApp(tk.Tk):
         
         btn_upload = ttk.Button(control_frame, text="ອັບໂຫລດຮູບ (Upload QR)", style="Sidebar.TButton", command=self.upload_qr_teacher_action)
         btn_upload.pack(pady=10, fill="x")
+
+        btn_bulk = ttk.Button(control_frame, text="ນຳເຂົ້າຫຼາຍຮູບ (Folder/ZIP)", style="Sidebar.TButton", command=self.bulk_import_action)
+        btn_bulk.pack(pady=10, fill="x")
+
+        btn_replay = ttk.Button(control_frame, text="ສະແກນຈາກວິດີໂອ (Replay)", style="Sidebar.TButton", command=self.replay_video_action)
+        btn_replay.pack(pady=10, fill="x")
         
         # Status
         self.lbl_status = tk.Label(control_frame, text="ກະລຸນາເລືອກວິຊາ/ຫ້ອງ ແລະກົດເປີດກ້ອງ", bg=CARD_COLOR, fg="#888", font=("Segoe UI", 12), wraplength=200)
@@ -182,18 +288,20 @@ class AttendanceApp(tk.Tk):
             self.refresh_subjects()
 
     def toggle_camera_teacher(self):
-        if self.camera_running:
+        if self.engine.camera_running:
             self.stop_camera()
             self.btn_action.config(text="ເປີດກ້ອງ (Start Scan)")
-            self.lbl_status.config(text="ກ້ອງປິດແລ້ວ", fg="#888")
+            decoder = self.engine.frame_decoder
+            cost = f"\nDecode: {decoder.avg_cost_ms:.1f} ms/frame ({decoder.mode})" if decoder else ""
+            self.lbl_status.config(text=f"ກ້ອງປິດແລ້ວ{cost}", fg="#888")
         else:
             course = self.combo_course.get()
             room = self.entry_room.get().strip()
             if not course or not room:
                 messagebox.showwarning("Warning", "ກະລຸນາເລືອກວິຊາ ແລະ ຫ້ອງຮຽນ!")
                 return
-            self.active_course = course
-            self.active_room = room
+            self.engine.start_session(course, room)
+            self.engine.scanner_mode = self.combo_scanner.get()
             self.start_camera()
             self.btn_action.config(text="ປິດກ້ອງ (Stop Scan)")
             self.lbl_status.config(text=f"ກຳລັງສະແກນ...\n{course} @ {room}", fg=ACCENT_COLOR)
@@ -204,21 +312,248 @@ class AttendanceApp(tk.Tk):
         if not course or not room:
             messagebox.showwarning("Warning", "ກະລຸນາເລືອກວິຊາ ແລະ ຫ້ອງຮຽນກ່ອນອັບໂຫລດ!")
             return
-        self.active_course = course
-        self.active_room = room
+        self.engine.start_session(course, room)
         file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg")])
         if not file_path: return
+        self.update_status("ກຳລັງສະແກນຮູບ...", ACCENT_COLOR)
+        # A phone photo can take seconds through the preprocessing ladder; keep it off the Tk thread
+        threading.Thread(target=self._upload_worker, args=(self.engine, file_path), daemon=True).start()
+
+    def _upload_worker(self, engine, file_path):
+        try:
+            # Results are reported through on_checkin_event
+            if not engine.feed_image(file_path):
+                self.update_status("Scan Failed: No QR found", WARNING_COLOR)
+        except Exception as e:
+            self.update_status(f"Error: {e}", ERROR_COLOR)
+
+    def bulk_import_action(self):
+        course = self.combo_course.get()
+        room = self.entry_room.get().strip()
+        if not course or not room:
+            messagebox.showwarning("Warning", "ກະລຸນາເລືອກວິຊາ ແລະ ຫ້ອງຮຽນກ່ອນອັບໂຫລດ!")
+            return
+        use_folder = messagebox.askyesnocancel("Bulk Import", "ເລືອກໂຟນເດີ? (Yes = Folder, No = ZIP)")
+        if use_folder is None: return
+        if use_folder:
+            path = filedialog.askdirectory()
+        else:
+            path = filedialog.askopenfilename(filetypes=[("ZIP Files", "*.zip")])
+        if not path: return
+        self.update_status("ກຳລັງນຳເຂົ້າ...", ACCENT_COLOR)
+        # Decoding happens in worker processes; this thread only waits and reports
+        threading.Thread(target=self._bulk_import_worker, args=(path, course, room), daemon=True).start()
+
+    def _bulk_import_worker(self, path, course, room):
+        import bulk_import
+        def progress(done, total):
+            self.update_status(f"ກຳລັງນຳເຂົ້າ... {done}/{total}", ACCENT_COLOR)
+        try:
+            report = bulk_import.run_import(path, self.db, course, room, progress=progress, roster=self.roster)
+        except Exception as e:
+            self.update_status(f"Error: {e}", ERROR_COLOR)
+            return
+        self.update_status(f"✓ ນຳເຂົ້າ {len(report['saved'])} ຄົນ", SUCCESS_COLOR)
+        lines = [
+            f"ຮູບທັງໝົດ: {report['total']}",
+            f"ສຳເລັດ: {len(report['saved'])}",
+            f"ຊ້ຳ (Duplicate): {len(report['duplicates'])}",
+            f"ລົ້ມເຫຼວ (Failed): {len(report['failed'])}",
+        ]
+        for label, reason in report["failed"][:15]:
+            lines.append(f"  - {label}: {reason}")
+        if len(report["failed"]) > 15:
+            lines.append(f"  ... +{len(report['failed']) - 15}")
+        for label, who in report["duplicates"][:15]:
+            lines.append(f"  = {label}: {who}")
+        self.after(0, lambda: messagebox.showinfo("Bulk Import", "\n".join(lines)))
+
+    def replay_video_action(self):
+        course = self.combo_course.get()
+        room = self.entry_room.get().strip()
+        if not course or not room:
+            messagebox.showwarning("Warning", "ກະລຸນາເລືອກວິຊາ ແລະ ຫ້ອງຮຽນກ່ອນ!")
+            return
+        path = filedialog.askopenfilename(filetypes=[("Video Files", "*.mp4;*.avi;*.mkv;*.mov"), ("All Files", "*.*")])
+        if not path: return
+        start = simpledialog.askstring("Replay", "ເວລາເລີ່ມບັນທຶກ (YYYY-MM-DD HH:MM:SS)\nວ່າງ = ເວລາຂອງໄຟລ໌")
+        if start is None: return
         try:
-            img = Image.open(file_path)
-            decoded = decode(img)
-            if decoded:
-                for obj in decoded:
-                    raw = obj.data.decode("utf-8")
-                    self.handle_scanned_data(raw)
-                    return
-            self.update_status("Scan Failed: No QR found", WARNING_COLOR)
+            start = datetime.strptime(start.strip(), "%Y-%m-%d %H:%M:%S") if start.strip() else None
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date format")
+            return
+        self.update_status("ກຳລັງປະມວນຜົນວິດີໂອ...", ACCENT_COLOR)
+        threading.Thread(target=self._replay_worker, args=(path, course, room, start), daemon=True).start()
+
+    def _replay_worker(self, path, course, room, start):
+        import replay
+        def progress(done, total):
+            self.update_status(f"ກຳລັງປະມວນຜົນວິດີໂອ... {done}/{total or '?'}", ACCENT_COLOR)
+        try:
+            report = replay.replay(path, self.db, course, room, start=start, roster=self.roster, progress=progress)
         except Exception as e:
             self.update_status(f"Error: {e}", ERROR_COLOR)
+            return
+        self.update_status(f"✓ ວິດີໂອ: {len(report['saved'])} ຄົນ ({report['speed_x']:.1f}x)", SUCCESS_COLOR)
+        lines = [
+            f"Frames: {report['frames']} ({report['decoded']} decoded, {report['speed_x']:.1f}x real time)",
+            f"ສຳເລັດ: {len(report['saved'])}",
+            f"ຊ້ຳ (Duplicate): {len(report['duplicates'])}",
+            f"ລົ້ມເຫຼວ (Failed): {len(report['failed'])}",
+        ]
+        lines += [f"  ✓ {when} {who}" for when, who in report["saved"][:15]]
+        lines += [f"  - {when} {why}" for when, why in report["failed"][:10]]
+        self.after(0, lambda: messagebox.showinfo("Replay", "\n".join(lines)))
+
+    # ==========================
+    # SESSIONS MODE (multi-camera)
+    # ==========================
+    def show_sessions_mode(self):
+        self.clear_content()
+        self.current_mode = "Sessions"
+
+        ttk.Label(self.content_area, text="ຫຼາຍກ້ອງ: ສະແກນພ້ອມກັນ", style="Header.TLabel").pack(pady=20)
+
+        form = ttk.Frame(self.content_area, style="Card.TFrame", padding=15)
+        form.pack(fill="x", padx=20)
+
+        tk.Label(form, text="ກ້ອງ / URL:", bg=CARD_COLOR, fg="white").pack(side="left")
+        self.entry_session_source = ttk.Entry(form, width=22)
+        self.entry_session_source.insert(0, "1")
+        self.entry_session_source.pack(side="left", padx=5)
+
+        tk.Label(form, text="ວິຊາ:", bg=CARD_COLOR, fg="white").pack(side="left", padx=(10, 0))
+        self.combo_session_course = ttk.Combobox(form, values=self.db.get_subjects(), width=14, state="readonly")
+        self.combo_session_course.pack(side="left", padx=5)
+
+        tk.Label(form, text="ຫ້ອງ:", bg=CARD_COLOR, fg="white").pack(side="left", padx=(10, 0))
+        self.entry_session_room = ttk.Entry(form, width=8)
+        self.entry_session_room.pack(side="left", padx=5)
+
+        ttk.Button(form, text="▶ ເລີ່ມ", style="Action.TButton", command=self.add_session_action).pack(side="left", padx=10)
+        ttk.Button(form, text="■ ຢຸດ", style="Danger.TButton", command=self.stop_session_action).pack(side="left")
+
+        table_frame = ttk.Frame(self.content_area, style="Card.TFrame", padding=10)
+        table_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        self.session_tree = ttk.Treeview(table_frame, columns=list(SESSION_COLUMNS), show="headings")
+        for key, heading in SESSION_COLUMNS.items():
+            self.session_tree.heading(key, text=heading)
+            self.session_tree.column(key, width=170 if key in ("source", "last") else 60, anchor="center")
+        self.session_tree.pack(fill="both", expand=True)
+
+        self.lbl_sessions_total = tk.Label(self.content_area, text="", bg=BG_COLOR, fg=ACCENT_COLOR)
+        self.lbl_sessions_total.pack(pady=(0, 10))
+        self.refresh_sessions_dashboard()
+
+    def add_session_action(self):
+        source = self.entry_session_source.get().strip()
+        course = self.combo_session_course.get()
+        room = self.entry_session_room.get().strip()
+        if not source or not course or not room:
+            messagebox.showwarning("Warning", "ກະລຸນາປ້ອນ ກ້ອງ, ວິຊາ ແລະ ຫ້ອງ!")
+            return
+        try:
+            self.sessions.add(source, course, room)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.refresh_sessions_dashboard()
+
+    def stop_session_action(self):
+        for item in self.session_tree.selection():
+            self.sessions.stop(int(item))
+        self.refresh_sessions_dashboard()
+
+    def refresh_sessions_dashboard(self):
+        # Polls engine counters on the Tk thread; rows are updated in place so the selection survives
+        if self.refresh_job:
+            self.after_cancel(self.refresh_job)
+        rows = self.sessions.stats()
+        live = {str(session_id) for session_id, _ in rows}
+        for item in self.session_tree.get_children():
+            if item not in live:
+                self.session_tree.delete(item)
+        total_rate = 0.0
+        for session_id, st in rows:
+            total_rate += st["checkins_per_sec"] * 60
+            values = (st["source"], st["course"], st["room"], "● ON" if st["running"] else "○ END",
+                      f"{st['fps']:.1f}", st["frames_dropped"], st["checkins"], st["duplicates"],
+                      st["rejected"], f"{st['checkins_per_sec'] * 60:.1f}", st["last"])
+            if self.session_tree.exists(str(session_id)):
+                self.session_tree.item(str(session_id), values=values)
+            else:
+                self.session_tree.insert("", "end", iid=str(session_id), values=values)
+        self.lbl_sessions_total.config(text=f"{len(rows)} sessions · {total_rate:.1f} ເຊັກຊື່/ນາທີ")
+        self.refresh_job = self.after(DASHBOARD_REFRESH_MS, self.refresh_sessions_dashboard)
+
+    # ==========================
+    # DIAGNOSTICS MODE
+    # ==========================
+    def show_diagnostics_mode(self):
+        self.clear_content()
+        self.current_mode = "Diagnostics"
+
+        ttk.Label(self.content_area, text="ວິເຄາະລະບົບ (Diagnostics)", style="Header.TLabel").pack(pady=20)
+
+        bar = ttk.Frame(self.content_area, style="Card.TFrame", padding=10)
+        bar.pack(fill="x", padx=20)
+        ttk.Button(bar, text="💾 ບັນທຶກ (JSON / Prometheus)", style="Action.TButton", command=self.save_metrics_action).pack(side="left")
+        ttk.Button(bar, text="Reset", command=self.reset_metrics_action).pack(side="left", padx=10)
+        self.lbl_diag_uptime = tk.Label(bar, text="", bg=CARD_COLOR, fg="#888")
+        self.lbl_diag_uptime.pack(side="right")
+
+        frame = ttk.Frame(self.content_area, style="Card.TFrame", padding=10)
+        frame.pack(fill="both", expand=True, padx=20, pady=20)
+        ttk.Label(frame, text="Latency (ms)", style="Body.TLabel").pack(anchor="w")
+        self.diag_latency = ttk.Treeview(frame, columns=("count", "p50", "p95", "p99", "max"), height=7)
+        self.diag_latency.heading("#0", text="Stage")
+        for col in ("count", "p50", "p95", "p99", "max"):
+            self.diag_latency.heading(col, text=col)
+            self.diag_latency.column(col, width=100, anchor="center")
+        self.diag_latency.pack(fill="x", pady=(5, 15))
+
+        ttk.Label(frame, text="Counters", style="Body.TLabel").pack(anchor="w")
+        self.diag_counters = ttk.Treeview(frame, columns=("total", "per_sec"), height=7)
+        self.diag_counters.heading("#0", text="Event")
+        self.diag_counters.heading("total", text="Total")
+        self.diag_counters.heading("per_sec", text="/s (10s)")
+        self.diag_counters.pack(fill="x", pady=5)
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        if self.refresh_job:
+            self.after_cancel(self.refresh_job)
+        snap = metrics.snapshot()
+        fmt = lambda h, k: f"{h[k]:.2f}" if k in h else "-"
+        for tree, rows in (
+            (self.diag_latency, [(n, (h["count"], fmt(h, "p50_ms"), fmt(h, "p95_ms"), fmt(h, "p99_ms"), fmt(h, "max_ms")))
+                                 for n, h in snap["latency"].items()]),
+            (self.diag_counters, [(n, (c["total"], f"{c['per_sec']:.1f}")) for n, c in snap["counters"].items()]),
+        ):
+            for name, values in rows:
+                if tree.exists(name):
+                    tree.item(name, values=values)
+                else:
+                    tree.insert("", "end", iid=name, text=name, values=values)
+        self.lbl_diag_uptime.config(text=f"uptime {snap['uptime_s']:.0f} s")
+        self.refresh_job = self.after(DASHBOARD_REFRESH_MS, self.refresh_diagnostics)
+
+    def save_metrics_action(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom")])
+        if not path: return
+        try:
+            metrics.dump(path)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return
+        messagebox.showinfo("Success", f"ບັນທຶກແລ້ວ: {path}")
+
+    def reset_metrics_action(self):
+        metrics.REGISTRY.reset()
+        for tree in (self.diag_latency, self.diag_counters):
+            tree.delete(*tree.get_children())
 
     # ==========================
     # STUDENT MODE
@@ -241,6 +576,12 @@ class AttendanceApp(tk.Tk):
         bbox = ttk.Button(input_frame, text="ສ້າງ QR Code", style="Action.TButton", command=self.generate_student_qr)
         bbox.pack(pady=30, fill="x")
         
+        btn_batch = ttk.Button(input_frame, text="ສ້າງບັດຈາກ CSV (Batch PDF)", style="Sidebar.TButton", command=self.batch_cards_action)
+        btn_batch.pack(fill="x")
+        
+        btn_roster = ttk.Button(input_frame, text="ນຳເຂົ້າລາຍຊື່ (Roster CSV)", style="Sidebar.TButton", command=self.import_roster_action)
+        btn_roster.pack(fill="x", pady=(10, 0))
+        
         self.qr_display_frame = tk.Frame(card, bg="white", width=300, height=300)
         self.qr_display_frame.pack(side="right", padx=20)
         self.qr_display_frame.pack_propagate(False)
@@ -253,7 +594,9 @@ class AttendanceApp(tk.Tk):
         if not sid or not name:
             messagebox.showwarning("Error", "Please fill all fields")
             return
-        data = f"{sid}|{name}"
+        # The signed card only carries the ID; keep the name so scans can show it
+        self.db.remember_students([(sid, name)])
+        data = cards.student_payload(sid, name)
         img = generate_qr_image(data)
         img = img.resize((280, 280))
         self.tk_qr_img = ImageTk.PhotoImage(img)
@@ -261,21 +604,64 @@ class AttendanceApp(tk.Tk):
         self.lbl_qr_image.image = self.tk_qr_img
         messagebox.showinfo("Success", "QR Code ພ້ອມໃຊ້ງານ! ຢື່ນໃຫ້ອາຈານສະແກນໄດ້ເລີຍ")
 
+    def batch_cards_action(self):
+        roster = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
+        if not roster: return
+        pdf_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Files", "*.pdf")])
+        if not pdf_path: return
+        # Rendering runs in worker processes; keep the Tk thread free
+        threading.Thread(target=self._batch_cards_worker, args=(roster, pdf_path), daemon=True).start()
+
+    def _batch_cards_worker(self, roster, pdf_path):
+        try:
+            n, rendered, files = cards.generate_cards(roster, pdf_path=pdf_path)
+            self.db.remember_students(cards.read_roster(roster))
+        except Exception as e:
+            self.after(0, lambda: messagebox.showerror("Error", f"Failed to create cards: {e}"))
+            return
+        msg = f"ສ້າງບັດ {n} ຄົນ ສຳເລັດ! (ໃໝ່ {rendered}, cache {n - rendered})\n" + "\n".join(files)
+        self.after(0, lambda: messagebox.showinfo("Success", msg))
+
+    def import_roster_action(self):
+        path = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
+        if not path: return
+        try:
+            rows = roster.read_roster(path)
+            course = None
+            # Files without a course column can still enroll everyone in one subject
+            if rows and all(c is None for _, _, c in rows):
+                course = simpledialog.askstring("Roster", "ລົງທະບຽນວິຊາໃດ? (ວ່າງ = ບໍ່ລົງທະບຽນ)") or None
+            n = roster.load_roster_csv(self.db, path, course)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to import roster: {e}")
+            return
+        messagebox.showinfo("Success", f"ນຳເຂົ້າລາຍຊື່ {n} ຄົນ ສຳເລັດ! (ທັງໝົດ {len(self.roster)} ຄົນ)")
+
     # ==========================
     # HISTORY MODE
     # ==========================
     def show_history_mode(self):
         self.clear_content()
         self.current_mode = "History"
-        ttk.Label(self.content_area, text="ປະຫວັດການເຂົ້າຮຽນ (ມື້ນີ້)", style="Header.TLabel").pack(pady=20)
+        ttk.Label(self.content_area, text="ປະຫວັດການເຂົ້າຮຽນ (History)", style="Header.TLabel").pack(pady=20)
         
         # Controls Frame (Filter)
         ctrl_frame = ttk.Frame(self.content_area, style="Card.TFrame", padding=10)
         ctrl_frame.pack(fill="x", padx=40)
         
-        ttk.Label(ctrl_frame, text="ຄັດກອງຕາມວິຊາ:", style="Body.TLabel").pack(side="left")
+        today = datetime.now().strftime("%Y-%m-%d")
+        ttk.Label(ctrl_frame, text="ຈາກ:", style="Body.TLabel").pack(side="left")
+        self.entry_from = ttk.Entry(ctrl_frame, font=FONT_BODY, width=11)
+        self.entry_from.insert(0, self.history_range[0] if self.history_range else today)
+        self.entry_from.pack(side="left", padx=(5, 10))
+        ttk.Label(ctrl_frame, text="ຫາ:", style="Body.TLabel").pack(side="left")
+        self.entry_to = ttk.Entry(ctrl_frame, font=FONT_BODY, width=11)
+        self.entry_to.insert(0, self.history_range[1] if self.history_range else today)
+        self.entry_to.pack(side="left", padx=(5, 10))
+        
+        ttk.Label(ctrl_frame, text="ວິຊາ:", style="Body.TLabel").pack(side="left")
         
-        self.history_combo = ttk.Combobox(ctrl_frame, font=FONT_BODY, width=20, state="readonly")
+        self.history_combo = ttk.Combobox(ctrl_frame, font=FONT_BODY, width=16, state="readonly")
         subs = ["All"] + self.db.get_subjects()
         self.history_combo['values'] = subs
         self.history_combo.current(0)
@@ -303,45 +689,97 @@ class AttendanceApp(tk.Tk):
         }
         
         columns_list = list(cols.keys())
-        self.tree = ttk.Treeview(table_frame, columns=columns_list, show="headings", height=15)
+        tree_frame = tk.Frame(table_frame, bg=CARD_COLOR)
+        tree_frame.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(tree_frame, columns=columns_list, show="headings", height=15)
         
         for col_id, text in cols.items():
             self.tree.heading(col_id, text=text)
             self.tree.column(col_id, width=120)
         
         self.tree.column("ID_DB", width=0, stretch=tk.NO)
-        self.tree.pack(fill="both", expand=True)
+        self.tree.column("Time", width=160)
+        scroll = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
         
         # Buttons
         btn_frame = tk.Frame(table_frame, bg=CARD_COLOR)
         btn_frame.pack(fill="x", pady=10)
         
+        # Pager: only one page of rows is ever loaded into the Treeview
+        ttk.Button(btn_frame, text="◀", width=3, command=self.history_prev_page).pack(side="left")
+        ttk.Button(btn_frame, text="▶", width=3, command=self.history_next_page).pack(side="left", padx=5)
+        self.lbl_page = tk.Label(btn_frame, text="", bg=CARD_COLOR, fg=TEXT_COLOR, font=FONT_BODY)
+        self.lbl_page.pack(side="left", padx=10)
+        
         btn_del = ttk.Button(btn_frame, text="ລົບຂໍ້ມູນ (Delete)", style="Danger.TButton", command=self.delete_selected_history)
         btn_del.pack(side="right", padx=5)
         
-        btn_export = ttk.Button(btn_frame, text="Export Excel", style="Success.TButton", command=self.export_to_excel)
+        btn_export = ttk.Button(btn_frame, text="Export (Excel/CSV)", style="Success.TButton", command=self.export_to_excel)
         btn_export.pack(side="right", padx=5)
         
         self.refresh_history_table()
 
     def refresh_history_table(self):
-        # Clear
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # Apply the filter and go back to the first page
+        start = self.entry_from.get().strip()
+        end = self.entry_to.get().strip()
+        try:
+            datetime.strptime(start, "%Y-%m-%d")
+            datetime.strptime(end, "%Y-%m-%d")
+        except ValueError:
+            messagebox.showwarning("Warning", "ວັນທີຕ້ອງເປັນ YYYY-MM-DD")
+            return
+        if start > end:
+            start, end = end, start
             
         subject = self.history_combo.get()
         if subject == "All": subject = None
         self.history_filter_subject = subject
-        
-        today = datetime.now().strftime("%Y-%m-%d")
-        records = self.db.get_attendance_by_date(today, subject=subject)
+        self.history_range = (start, end)
+        self.history_total = self.db.count_attendance(start, end, subject)
+        self.history_offset = 0
+        self.load_history_page(after=None)
+        self.update_page_label()
+
+    def load_history_page(self, after=None, before=None):
+        # Returns False (and keeps the current page) when there is nothing in that direction
+        start, end = self.history_range
+        # r: (id, std_id, name, course, room, date_time, total check-ins)
+        records = self.db.get_attendance_page(start, end, self.history_filter_subject,
+                                              after=after, before=before, limit=HISTORY_PAGE_SIZE)
+        if not records and (after or before):
+            return False
+        self.history_anchor = (after, before)
         self.current_records = records
         
+        self.tree.delete(*self.tree.get_children())
+        single_day = start == end
         for r in records:
-            t_str = r[5].split(" ")[1] if " " in r[5] else r[5]
-            stats = self.db.get_student_stats(r[1])
-            name_display = f"{r[2]} ({stats} ຄັ້ງ)"
+            t_str = r[5].split(" ")[1] if single_day and " " in r[5] else r[5]
+            name_display = f"{r[2]} ({r[6]} ຄັ້ງ)"
             self.tree.insert("", "end", values=(r[0], t_str, r[1], name_display, r[3], r[4]))
+        return True
+
+    def update_page_label(self):
+        n = len(self.current_records)
+        first = self.history_offset + 1 if n else 0
+        self.lbl_page.config(text=f"{first}–{self.history_offset + n} / {self.history_total:,}")
+
+    def history_next_page(self):
+        if not self.current_records: return
+        n = len(self.current_records)
+        if self.load_history_page(after=page_key(self.current_records[-1])):
+            self.history_offset += n
+            self.update_page_label()
+
+    def history_prev_page(self):
+        if not self.current_records or self.history_offset == 0: return
+        if self.load_history_page(before=page_key(self.current_records[0])):
+            self.history_offset = max(0, self.history_offset - len(self.current_records))
+            self.update_page_label()
 
     def delete_selected_history(self):
         selected = self.tree.selection()
@@ -350,39 +788,61 @@ class AttendanceApp(tk.Tk):
             return
             
         if messagebox.askyesno("Confirm", "ຕ້ອງການລົບຂໍ້ມູນນີ້ຫຼືບໍ່?"):
+            archived = 0
             for item in selected:
                 vals = self.tree.item(item, 'values')
                 db_id = vals[0]
-                self.db.delete_attendance(db_id)
-            self.refresh_history_table()
+                if not self.db.delete_attendance(db_id):
+                    archived += 1
+            if archived:
+                messagebox.showwarning("Warning", f"{archived} ແຖວຢູ່ໃນພາກຮຽນທີ່ຈັດເກັບແລ້ວ (Archived, read-only) ລົບບໍ່ໄດ້")
+            # Stay on the current page
+            self.history_total = self.db.count_attendance(*self.history_range, self.history_filter_subject)
+            after, before = self.history_anchor
+            if self.load_history_page(after=after, before=before):
+                self.update_page_label()
+            else:
+                self.refresh_history_table()
 
     def export_to_excel(self):
-        if not hasattr(self, 'current_records') or not self.current_records:
+        # Streams the whole filtered range (not just the visible page) on a background thread
+        if not self.history_total:
             messagebox.showwarning("Warning", "ບໍ່ມີຂໍ້ມູນໃຫ້ Export")
             return
             
-        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel Files", "*.xlsx")])
+        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[
+            ("Excel Files", "*.xlsx"), ("CSV Files", "*.csv"), ("Parquet Files", "*.parquet")])
         if not file_path: return
         
-        # Prepare Data for Pandas
-        data = []
-        for r in self.current_records:
-            # r: (id, std_id, name, course, room, date_time)
-            data.append({
-                "Student ID": r[1],
-                "Name": r[2],
-                "Course": r[3],
-                "Room": r[4],
-                "Date Time": r[5]
-            })
-            
-        df = pd.DataFrame(data)
-        try:
-            # Explicitly use openpyxl engine
-            df.to_excel(file_path, index=False, engine='openpyxl')
-            messagebox.showinfo("Success", f"Export ສຳເລັດ!\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to export: {e}")
+        start, end = self.history_range
+        subjects = [self.history_filter_subject] if self.history_filter_subject else None
+        
+        win = tk.Toplevel(self)
+        win.title("Export")
+        win.configure(bg=CARD_COLOR)
+        win.transient(self)
+        lbl = tk.Label(win, text="ກຳລັງ Export...", bg=CARD_COLOR, fg=TEXT_COLOR, font=FONT_BODY)
+        lbl.pack(padx=20, pady=(20, 5))
+        bar = ttk.Progressbar(win, length=300, maximum=max(1, self.history_total))
+        bar.pack(padx=20, pady=5)
+        
+        def on_progress(done, total):
+            self.after(0, lambda: (bar.config(maximum=max(1, total), value=done), lbl.config(text=f"{done:,} / {total:,}")))
+        
+        def on_done(n):
+            self.after(0, lambda: (win.destroy(), messagebox.showinfo("Success", f"Export ສຳເລັດ! ({n:,} rows)\n{file_path}")))
+        
+        def on_error(e):
+            if isinstance(e, ExportCancelled):
+                self.after(0, win.destroy)
+            else:
+                self.after(0, lambda: (win.destroy(), messagebox.showerror("Error", f"Failed to export: {e}")))
+        
+        job = ExportJob(self.db.db_name, file_path, start, end, subjects,
+                        on_progress=on_progress, on_done=on_done, on_error=on_error)
+        ttk.Button(win, text="ຍົກເລີກ (Cancel)", style="Danger.TButton", command=job.cancel).pack(pady=(5, 20))
+        win.protocol("WM_DELETE_WINDOW", job.cancel)
+        job.start()
 
     # ==========================
     # STATISTICS MODE (Matplotlib)
@@ -404,43 +864,120 @@ class AttendanceApp(tk.Tk):
         self.combo_stats.pack(side="left", padx=10)
         if self.combo_stats['values']: self.combo_stats.current(0)
         
+        self.combo_chart = ttk.Combobox(ctrl_frame, font=FONT_BODY, width=24, state="readonly", values=list(STATS_CHARTS.values()))
+        self.combo_chart.current(0)
+        self.combo_chart.pack(side="left", padx=10)
+        
         btn_show = ttk.Button(ctrl_frame, text="ສະແດງກຣາຟ", style="Action.TButton", command=self.render_graph)
         btn_show.pack(side="left")
 
-        # Graph Canvas
+        # Graph Canvas: one figure/canvas per visit, redrawn in place on every click
         self.graph_frame = tk.Frame(self.content_area, bg="white")
         self.graph_frame.pack(fill="both", expand=True, padx=40, pady=20)
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.stats_fig = Figure(figsize=(8, 5))
+        self.stats_canvas = FigureCanvasTkAgg(self.stats_fig, master=self.graph_frame)
+        self.stats_canvas.get_tk_widget().pack(fill="both", expand=True)
+        self.stats_key = None
+        self.stats_artist = None
+
+    def close_stats_figure(self):
+        # Drop the figure when leaving Stats so long sessions don't accumulate them
+        if self.stats_fig is not None:
+            self.stats_fig.clear()
+        self.stats_fig = None
+        self.stats_canvas = None
+        self.stats_artist = None
+
+    def stats_data(self, chart, subject):
+        # Returns (labels, values) for the chart; for the heatmap labels is (rooms, days)
+        if chart == "top":
+            data = self.db.get_subject_stats(subject)[:10]
+            return [d[0] for d in data], [d[1] for d in data]
+        if chart == "trend":
+            data = self.db.get_course_daily_counts(subject)
+            return [d[0] for d in data], [d[1] for d in data]
+        if chart == "rate":
+            sessions = len(self.db.get_course_daily_counts(subject))
+            data = self.db.get_subject_stats(subject)[:30]
+            return [d[0] for d in data], [100.0 * d[1] / sessions if sessions else 0 for d in data]
+        # heatmap: last 30 days that have any check-in
+        data = self.db.get_course_room_day_counts(subject)
+        days = sorted({d[1] for d in data})[-30:]
+        rooms = sorted({d[0] for d in data})
+        col = {d: i for i, d in enumerate(days)}
+        row = {r: i for i, r in enumerate(rooms)}
+        grid = [[0] * len(days) for _ in rooms]
+        for room, day, count in data:
+            if day in col:
+                grid[row[room]][col[day]] = count
+        return (rooms, days), grid
 
     def render_graph(self):
         subject = self.combo_stats.get()
-        if not subject: return
+        if not subject or self.stats_fig is None: return
+        chart = list(STATS_CHARTS)[self.combo_chart.current()]
         
-        # Clear previous graph
-        for widget in self.graph_frame.winfo_children():
-            widget.destroy()
-            
-        # Get data
-        data = self.db.get_subject_stats(subject) # [(name, count), ...]
+        labels, values = self.stats_data(chart, subject)
+        key = (chart, subject, str(labels))
         
-        if not data:
-            tk.Label(self.graph_frame, text="ບໍ່ມີຂໍ້ມູນສຳລັບວິຊານີ້", font=FONT_HEADER, bg="white").pack(pady=50)
+        # Same chart with the same categories: only the numbers changed, update artists in place
+        if key == self.stats_key and self.stats_artist is not None:
+            ax = self.stats_fig.axes[0]
+            if chart in ("top", "rate"):
+                for bar, v in zip(self.stats_artist, values):
+                    bar.set_height(v) if chart == "top" else bar.set_width(v)
+            elif chart == "trend":
+                self.stats_artist.set_ydata(values)
+            else:
+                self.stats_artist.set_data(values)
+                self.stats_artist.autoscale()
+            ax.relim()
+            ax.autoscale_view()
+            self.stats_canvas.draw_idle()
             return
-            
-        # Prepare Data for Plot
-        names = [d[0] for d in data[:10]] # Top 10
-        counts = [d[1] for d in data[:10]]
-        
-        # Create Plot
-        fig, ax = plt.subplots(figsize=(8, 5))
-        ax.bar(names, counts, color="#00adb5")
-        ax.set_title(f"Attendance Stats: {subject}")
-        ax.set_ylabel("Check-in Count")
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        
-        canvas = FigureCanvasTkAgg(fig, master=self.graph_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
+        
+        self.stats_fig.clear()
+        ax = self.stats_fig.add_subplot()
+        self.stats_key = key
+        self.stats_artist = None
+        
+        if not values:
+            ax.text(0.5, 0.5, "No data", ha="center", va="center", fontsize=20, transform=ax.transAxes)
+            ax.set_axis_off()
+        elif chart == "top":
+            self.stats_artist = ax.bar(labels, values, color=ACCENT_COLOR)
+            ax.set_title(f"Attendance Stats: {subject}")
+            ax.set_ylabel("Check-in Count")
+            ax.tick_params(axis="x", labelrotation=45)
+            for t in ax.get_xticklabels():
+                t.set_ha("right")
+        elif chart == "trend":
+            (self.stats_artist,) = ax.plot(range(len(labels)), values, marker="o", color=ACCENT_COLOR)
+            ax.set_title(f"Daily Attendance: {subject}")
+            ax.set_ylabel("Students")
+            step = max(1, len(labels) // 10)
+            ax.set_xticks(range(0, len(labels), step))
+            ax.set_xticklabels(labels[::step], rotation=45, ha="right")
+        elif chart == "rate":
+            self.stats_artist = ax.barh(labels, values, color=SUCCESS_COLOR)
+            ax.invert_yaxis()
+            ax.set_xlim(0, 100)
+            ax.set_title(f"Attendance Rate: {subject}")
+            ax.set_xlabel("% of sessions")
+        else:
+            rooms, days = labels
+            self.stats_artist = ax.imshow(values, aspect="auto", cmap="YlGnBu")
+            ax.set_title(f"Check-ins per Room/Day: {subject}")
+            ax.set_yticks(range(len(rooms)))
+            ax.set_yticklabels(rooms)
+            step = max(1, len(days) // 10)
+            ax.set_xticks(range(0, len(days), step))
+            ax.set_xticklabels(days[::step], rotation=45, ha="right")
+            self.stats_fig.colorbar(self.stats_artist, ax=ax)
+        self.stats_fig.tight_layout()
+        self.stats_canvas.draw_idle()
 
     # ==========================
     # HELPERS
@@ -459,55 +996,36 @@ class AttendanceApp(tk.Tk):
     # CAMERA LOGIC
     # ==========================
     def start_camera(self):
-        if self.camera_running: return
-        self.camera_running = True
-        self.video_thread = threading.Thread(target=self.video_loop, daemon=True)
-        self.video_thread.start()
+        from preview import PreviewRenderer
+        if self.preview is None:
+            self.preview = PreviewRenderer(self.lbl_video, max_fps=PREVIEW_FPS)
+        self.camera_started_at = time.perf_counter()
+        self.engine.start_camera(0)
 
     def stop_camera(self):
-        self.camera_running = False
-        if self.cap:
-            self.cap.release()
-        self.cap = None
-
-    def video_loop(self):
-        self.cap = cv2.VideoCapture(0)
-        while self.camera_running:
-            ret, frame = self.cap.read()
-            if ret:
-                cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(cv2image)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.lbl_video.after(0, lambda i=imgtk: self.lbl_video.config(image=i) or setattr(self.lbl_video, 'image', i))
-                
-                # Scan Logic
-                current_time = time.time()
-                if current_time - self.last_scan_time > self.scan_cooldown:
-                    decoded = decode(frame)
-                    for obj in decoded:
-                        raw = obj.data.decode("utf-8")
-                        self.handle_scanned_data(raw)
-                        self.last_scan_time = current_time
-                        break
-            time.sleep(0.03)
+        if self._engine:
+            self._engine.stop_camera()
+
+    def on_camera_frame(self, frame):
+        # Called on the engine's capture thread
+        if self.camera_started_at is not None:
+            metrics.observe("first_frame", time.perf_counter() - self.camera_started_at)
+            self.camera_started_at = None
+        preview = self.preview
+        if preview:
+            preview.submit(frame)
+
+    def on_checkin_event(self, event):
+        # Called on whichever thread recorded the scan (engine persistence thread or Tk)
+        if event.student_id is None:
+            self.update_status(event.message, ERROR_COLOR)
+        elif event.success:
+            self.update_status(f"✓ {event.message}\n({event.student_name or event.student_id})", SUCCESS_COLOR)
+        else:
+            self.update_status(f"⚠ {event.message}\n({event.student_name or event.student_id})", WARNING_COLOR)
 
     def handle_scanned_data(self, data):
-        try:
-            parts = data.split('|')
-            if len(parts) >= 2:
-                std_id = parts[0]
-                std_name = parts[1]
-                
-                success, msg = self.db.save_attendance(std_id, std_name, self.active_course, self.active_room)
-                
-                if success:
-                    self.update_status(f"✓ {msg}\n({std_name})", SUCCESS_COLOR)
-                else:
-                    self.update_status(f"⚠ {msg}\n({std_name})", WARNING_COLOR)
-            else:
-                self.update_status("Invalid QR Format", ERROR_COLOR)
-        except Exception as e:
-            print(e)
+        return self.engine.handle_payload(data)
 
 if __name__ == "__main__":
     app = AttendanceApp()
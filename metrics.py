@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Lightweight in-process instrumentation for the scan hot paths.
+#   with metrics.timer("decode"): ...      rolling latency histogram
+#   metrics.inc("checkins")                 counter + per-second rate
+# snapshot() feeds the Diagnostics panel; dump() writes JSON or Prometheus text
+# (node_exporter textfile format) for headless runs.
+
+# Recorded stages, in pipeline order (also the panel's row order)
+STAGES = ("capture", "convert", "decode", "checkin", "db_save", "preview")
+HISTOGRAM_WINDOW = 2048
+RATE_WINDOW = 10      # seconds
+
+
+class Histogram:
+    # Keeps the last `window` samples; percentiles are computed on demand
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def snapshot(self):
+        s = sorted(self.samples)
+        if not s:
+            return {"count": self.count, "sum_s": self.total}
+        pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] * 1000.0
+        return {
+            "count": self.count,
+            "sum_s": self.total,
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": s[-1] * 1000.0,
+        }
+
+
+class Meter:
+    # Monotonic counter plus a rate over the last RATE_WINDOW whole seconds
+    def __init__(self):
+        self.total = 0
+        self.buckets = deque(maxlen=RATE_WINDOW + 1)   # [second, count]
+
+    def inc(self, n=1, now=None):
+        sec = int(time.monotonic() if now is None else now)
+        if self.buckets and self.buckets[-1][0] == sec:
+            self.buckets[-1][1] += n
+        else:
+            self.buckets.append([sec, n])
+        self.total += n
+
+    def rate(self, now=None):
+        # The current second is still filling, so only completed seconds count
+        sec = int(time.monotonic() if now is None else now)
+        done = sum(c for s, c in self.buckets if sec - RATE_WINDOW <= s < sec)
+        # Don't dilute the rate of a meter younger than the window
+        span = min(RATE_WINDOW, sec - self.buckets[0][0]) if self.buckets else 0
+        return done / span if span > 0 else 0.0
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.meters = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = Histogram()
+            h.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def inc(self, name, n=1):
+        with self._lock:
+            m = self.meters.get(name)
+            if m is None:
+                m = self.meters[name] = Meter()
+            m.inc(n)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.meters.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            order = {name: i for i, name in enumerate(STAGES)}
+            names = sorted(self.histograms, key=lambda n: (order.get(n, len(order)), n))
+            return {
+                "timestamp": time.time(),
+                "uptime_s": time.time() - self.started,
+                "latency": {n: self.histograms[n].snapshot() for n in names},
+                "counters": {n: {"total": m.total, "per_sec": m.rate()} for n, m in sorted(self.meters.items())},
+            }
+
+    def to_prometheus(self, snap=None):
+        snap = snap or self.snapshot()
+        lines = ["# TYPE qr_attendance_latency_seconds summary"]
+        for name, h in snap["latency"].items():
+            for q in ("p50", "p95", "p99"):
+                if f"{q}_ms" in h:
+                    lines.append(f'qr_attendance_latency_seconds{{stage="{name}",quantile="0.{q[1:]}"}} {h[q + "_ms"] / 1000.0:.6f}')
+            lines.append(f'qr_attendance_latency_seconds_count{{stage="{name}"}} {h["count"]}')
+            lines.append(f'qr_attendance_latency_seconds_sum{{stage="{name}"}} {h["sum_s"]:.6f}')
+        lines.append("# TYPE qr_attendance_events_total counter")
+        for name, c in snap["counters"].items():
+            lines.append(f'qr_attendance_events_total{{event="{name}"}} {c["total"]}')
+        lines.append("# TYPE qr_attendance_events_per_second gauge")
+        for name, c in snap["counters"].items():
+            lines.append(f'qr_attendance_events_per_second{{event="{name}"}} {c["per_sec"]:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        # .json -> JSON snapshot, anything else (.prom, .txt) -> Prometheus text.
+        # Written via a temp file so scrapers never read a half-written file.
+        snap = self.snapshot()
+        if path.lower().endswith(".json"):
+            text = json.dumps(snap, indent=2)
+        else:
+            text = self.to_prometheus(snap)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return path
+
+
+# Process-wide registry shared by all engines, the database and the preview
+REGISTRY = Metrics()
+timer = REGISTRY.timer
+observe = REGISTRY.observe
+inc = REGISTRY.inc
+snapshot = REGISTRY.snapshot
+dump = REGISTRY.dump
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+# "full": pyzbar on the raw BGR frame (original behaviour)
+# "roi":  grayscale + downscaled decode, then only a padded region around the last hit
+# Defined here rather than in decoding.py so the GUI can list them without loading cv2/pyzbar
+SCANNER_MODES = ("roi", "full")
+
+
+class LatestFrameQueue:
+    # Single-slot hand-off between the capture and decoder threads.
+    # put() overwrites a frame the decoder hasn't picked up yet, so a slow
+    # decode drops stale frames instead of building a backlog.
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify_all()
+
+    def put_wait(self, item, timeout=None):
+        # For sources that must not lose frames (video files): waits until the slot is
+        # free. Returns False, without queueing, if it is still taken after timeout.
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._item is None, timeout):
+                return False
+            self._item = item
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        # Returns None if nothing arrived within timeout
+        with self._cond:
+            if self._item is None:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            if item is not None:
+                self._cond.notify_all()
+            return item
+
+    def clear(self):
+        with self._cond:
+            self._item = None
+            self._cond.notify_all()
+
+
+class RecentSeen:
+    # Per-payload cooldown: remembers when each QR payload was last seen and
+    # forgets it after ttl seconds. Entries are kept in last-seen order, so
+    # eviction only ever looks at the oldest end.
+    def __init__(self, ttl=3.0):
+        self.ttl = ttl
+        self._seen = OrderedDict()
+
+    def check(self, payload, now=None):
+        # True if payload is new (or its cooldown expired); either way it is marked as seen now
+        if now is None:
+            now = time.monotonic()
+        self.evict(now)
+        fresh = payload not in self._seen
+        self._seen[payload] = now
+        self._seen.move_to_end(payload)
+        return fresh
+
+    def evict(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        while self._seen:
+            payload, seen_at = next(iter(self._seen.items()))
+            if now - seen_at <= self.ttl:
+                break
+            del self._seen[payload]
+
+    def clear(self):
+        self._seen.clear()
+
+    def __len__(self):
+        return len(self._seen)
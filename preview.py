@@ -0,0 +1,91 @@
+import threading
+import time
+import tkinter as tk
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+import metrics
+
+# Camera preview for a Tk label.
+# The capture thread only hands over its newest frame; the Tk thread draws it into
+# one PhotoImage through reused numpy buffers. At most one redraw is queued at a time
+# and the preview runs at its own FPS cap, independent of the decode rate.
+
+
+class PreviewRenderer:
+    def __init__(self, label, max_fps=15, size=None):
+        self.label = label
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.size = size          # (w, h) of the drawn image; taken from the label on first draw
+        self.photo = None
+        self._rgb = None          # paste buffer, (h, w, 3) uint8
+        self._scaled = None       # resize target, same shape
+        self._frame = None
+        self._pending = False
+        self._last_draw = 0.0
+        self._lock = threading.Lock()
+        self.closed = False
+        self.drawn = 0
+        self.skipped = 0
+
+    def submit(self, frame):
+        # Capture thread. Frames over the FPS cap, or arriving while a redraw is
+        # queued, just replace the slot (newest frame wins); the cap only delays
+        # when the next redraw is scheduled
+        with self._lock:
+            if self.closed:
+                return
+            if self._frame is not None:
+                self.skipped += 1
+            self._frame = frame
+            if self._pending:
+                return
+            self._pending = True
+            delay = max(0.0, self._last_draw + self.min_interval - time.monotonic())
+        try:
+            self.label.after(int(delay * 1000), self._draw)
+        except (RuntimeError, tk.TclError):
+            # Tk is gone (window closed while the camera thread was still running)
+            self.closed = True
+
+    def _fit(self, frame):
+        # Largest size with the frame's aspect ratio that fits the label
+        fh, fw = frame.shape[:2]
+        lw, lh = self.label.winfo_width(), self.label.winfo_height()
+        if lw < 10 or lh < 10:
+            lw, lh = fw, fh
+        scale = min(lw / fw, lh / fh)
+        return max(1, int(fw * scale)), max(1, int(fh * scale))
+
+    def _draw(self):
+        # Tk thread
+        with self._lock:
+            frame, self._frame = self._frame, None
+            self._pending = False
+            self._last_draw = time.monotonic()
+        if frame is None or self.closed:
+            return
+        start = time.perf_counter()
+        try:
+            if self.size is None:
+                self.size = self._fit(frame)
+            w, h = self.size
+            if self._rgb is None or self._rgb.shape[:2] != (h, w):
+                self._rgb = np.empty((h, w, 3), np.uint8)
+                self._scaled = np.empty((h, w, 3), np.uint8)
+                self.photo = ImageTk.PhotoImage("RGB", (w, h))
+                self.label.config(image=self.photo, text="")
+            if frame.shape[1] != w or frame.shape[0] != h:
+                frame = cv2.resize(frame, (w, h), dst=self._scaled, interpolation=cv2.INTER_LINEAR)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+            # frombuffer wraps the buffer without copying; paste updates the existing Tk image
+            self.photo.paste(Image.frombuffer("RGB", (w, h), self._rgb, "raw", "RGB", 0, 1))
+            self.drawn += 1
+            metrics.observe("preview", time.perf_counter() - start)
+        except tk.TclError:
+            self.closed = True
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._frame = None
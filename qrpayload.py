@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import struct
+import time
+
+# Signed, compact card payloads.
+#   A1:<base32( len(id) | id | issued day (uint16, days since 1970) | HMAC-SHA256[:6] )>
+# Uppercase base32 without padding stays inside the QR alphanumeric set, so the
+# code is encoded in alphanumeric mode: IDs up to 10 characters fit version 3 at
+# ERROR_CORRECT_H, where "id|Lao name" in byte mode usually needs version 6-7.
+# A 48-bit tag is plenty here: every forgery attempt has to be shown to a scanner.
+# The name is not on the card any more; it comes from the roster/students table.
+# Old "id|name" cards are still accepted (see parse_payload).
+
+PREFIX = "A1:"
+MAC_BYTES = 6
+KEY_FILE = "qr_key.bin"
+INVALID_FORMAT = "Invalid QR Format"
+INVALID_SIGNATURE = "QR ບໍ່ຖືກຕ້ອງ (Invalid signature)"
+KEY_MISSING = "ບໍ່ພົບໄຟລ໌ກະແຈ QR (QR key file not found)"
+
+# path -> keyed HMAC object; verification copies it instead of re-keying per scan
+_macs = {}
+
+
+def load_key(path=KEY_FILE, create=False):
+    # 32 random bytes. Only card generation creates it (create=True); scanners must be given
+    # a copy of the issuing key, since a fresh one would silently reject every real card.
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        if not create:
+            raise ValueError(f"{KEY_MISSING}: {path}")
+    key = secrets.token_bytes(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process created it first; use theirs
+        with open(path, "rb") as f:
+            return f.read()
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _mac(key_path, create=False):
+    mac = _macs.get(key_path)
+    if mac is None:
+        mac = _macs[key_path] = hmac.new(load_key(key_path, create), digestmod=hashlib.sha256)
+    return mac
+
+
+def key_id(key_path=KEY_FILE, create=True):
+    # Short fingerprint of the key, e.g. for card cache keys; never the key itself
+    return hashlib.sha256(_mac(key_path, create).copy().digest()).hexdigest()[:12]
+
+
+def _sign(body, key_path, create=False):
+    mac = _mac(key_path, create).copy()
+    mac.update(body)
+    return mac.digest()[:MAC_BYTES]
+
+
+def encode_payload(student_id, issued=None, key_path=KEY_FILE):
+    sid = student_id.encode("utf-8")
+    if not 0 < len(sid) < 256:
+        raise ValueError("student_id must be 1-255 bytes")
+    # issued: unix seconds, stored with day resolution
+    issued = int(time.time() if issued is None else issued) // 86400
+    body = bytes([len(sid)]) + sid + struct.pack(">H", issued)
+    return PREFIX + base64.b32encode(body + _sign(body, key_path, create=True)).decode("ascii").rstrip("=")
+
+
+def decode_signed(data, key_path=KEY_FILE):
+    # Returns (student_id, issued unix seconds at day resolution) or raises ValueError,
+    # also when key_path does not exist (it is never created here)
+    raw = data[len(PREFIX):]
+    try:
+        blob = base64.b32decode(raw + "=" * (-len(raw) % 8))
+    except Exception:
+        raise ValueError(INVALID_FORMAT)
+    n = blob[0] if blob else 0
+    if n == 0 or len(blob) != 1 + n + 2 + MAC_BYTES:
+        raise ValueError(INVALID_FORMAT)
+    body, tag = blob[:-MAC_BYTES], blob[-MAC_BYTES:]
+    if not hmac.compare_digest(_sign(body, key_path), tag):
+        raise ValueError(INVALID_SIGNATURE)
+    try:
+        sid = body[1:1 + n].decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError(INVALID_FORMAT)
+    return sid, struct.unpack(">H", body[1 + n:])[0] * 86400
+
+
+def is_signed(data):
+    return data.startswith(PREFIX) and "|" not in data
+
+
+def parse_payload(data, key_path=KEY_FILE):
+    # Returns (student_id, name, error). name is None for signed cards;
+    # error is None when the payload is usable.
+    if is_signed(data):
+        try:
+            sid, _ = decode_signed(data, key_path)
+        except ValueError as e:
+            return None, None, str(e)
+        return sid, None, None
+    parts = data.split('|')
+    if len(parts) >= 2:
+        return parts[0], parts[1], None
+    return None, None, INVALID_FORMAT
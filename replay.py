@@ -0,0 +1,148 @@
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+import cv2
+from backend import ARCHIVED_TERM, Database
+from decoding import FrameDecoder, SCANNER_MODES
+from engine import is_live, parse_source
+from pipeline import RecentSeen
+from roster import RosterIndex, resolve_checkin
+import metrics
+import qrpayload
+
+# Offline check-in from recorded entrance footage (or a local RTSP/HTTP stream):
+#   python replay.py entrance.mp4 --course Math --room 112 --start "2026-03-02 07:55:00"
+# Frames are decoded as fast as the CPU allows (no real-time pacing). Each check-in is
+# stamped with the time the card was first seen in the video, not the time of the replay.
+
+COMMIT_EVERY = 500      # check-ins per bulk transaction
+DEFAULT_FPS = 30.0      # when the container doesn't report one
+
+
+def recording_start(path, duration):
+    # Without --start, assume the file was last written when the recording ended
+    return datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=duration)
+
+
+def replay(source, db, course, room, start=None, skip=2, cooldown=3.0, scanner_mode="full",
+           roster=None, key_path=qrpayload.KEY_FILE, accept_legacy=True, progress=None, cancel=None):
+    # skip: decode every `skip`-th frame; the others are only grabbed (not decoded into an image).
+    # cooldown: seconds of video time a payload is ignored after it was seen, so a card held
+    # up for several frames counts once. progress(frame_no, total_frames or 0) every 100 frames.
+    # Payloads are checked like a live scan (roster.resolve_checkin).
+    roster = roster if roster is not None else RosterIndex(db)
+    source = parse_source(source)
+    live = is_live(source)
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {source}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    total = 0 if live else int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if start is None and not live:
+        start = recording_start(source, total / fps)
+    wall_start = time.monotonic()
+
+    decoder = FrameDecoder(mode=scanner_mode)
+    seen = RecentSeen(ttl=cooldown)
+    report = {"frames": 0, "decoded": 0, "saved": [], "duplicates": [], "failed": []}
+    pending = []
+
+    def flush():
+        saved = db.save_attendance_bulk(pending, course, room)
+        for ok, (std_id, std_name, at) in zip(saved, pending):
+            when = at.strftime("%Y-%m-%d %H:%M:%S")
+            if ok is None:
+                # Backdated into an archived term: not a repeat scan, report why it was refused
+                metrics.inc("rejected")
+                report["failed"].append((when, f"{std_id}: {ARCHIVED_TERM}"))
+                continue
+            key = "saved" if ok else "duplicates"
+            metrics.inc("checkins" if ok else "duplicates")
+            report[key].append((when, f"{std_id} {std_name or ''}".strip()))
+        pending.clear()
+
+    index = -1
+    try:
+        while cancel is None or not cancel.is_set():
+            # grab() demuxes without decoding pixels, so skipped frames are cheap
+            if not cap.grab():
+                break
+            index += 1
+            if index % skip:
+                continue
+            ret, frame = cap.retrieve()
+            if not ret:
+                continue
+            if live:
+                at = datetime.now()
+                video_t = time.monotonic() - wall_start
+            else:
+                video_t = index / fps
+                at = start + timedelta(seconds=video_t)
+            report["decoded"] += 1
+            for obj in decoder.decode(frame):
+                raw = obj.data.decode("utf-8")
+                if not seen.check(raw, video_t):
+                    continue
+                std_id, std_name, error = resolve_checkin(raw, course, roster, db, key_path, accept_legacy)
+                if error:
+                    metrics.inc("rejected")
+                    report["failed"].append((at.strftime("%H:%M:%S"), f"{std_id}: {error}" if std_id else error))
+                    continue
+                pending.append((std_id, std_name, at))
+            if len(pending) >= COMMIT_EVERY:
+                flush()
+            if progress and index % 100 == 0:
+                progress(index, total)
+    finally:
+        cap.release()
+        if pending:
+            flush()
+    report["frames"] = index + 1
+    report["elapsed_s"] = time.monotonic() - wall_start
+    report["video_s"] = report["frames"] / fps
+    report["speed_x"] = report["video_s"] / report["elapsed_s"] if report["elapsed_s"] else 0.0
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check in students from recorded entrance video")
+    parser.add_argument("source", help="video file, or rtsp:// / http:// stream")
+    parser.add_argument("--course", required=True)
+    parser.add_argument("--room", required=True)
+    parser.add_argument("--start", help='wall-clock time of the first frame, "YYYY-MM-DD HH:MM:SS" '
+                                        "(default: file modification time minus its duration)")
+    parser.add_argument("--skip", type=int, default=2, help="decode every Nth frame")
+    parser.add_argument("--cooldown", type=float, default=3.0, help="seconds of video a card counts once")
+    parser.add_argument("--mode", default="full", choices=SCANNER_MODES)
+    parser.add_argument("--db", default="attendance.db")
+    parser.add_argument("--key", default=qrpayload.KEY_FILE)
+    parser.add_argument("--signed-only", action="store_true", help="reject plain id|name cards")
+    args = parser.parse_args(argv)
+
+    start = datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S") if args.start else None
+    db = Database(args.db)
+    try:
+        report = replay(args.source, db, args.course, args.room, start=start, skip=max(1, args.skip),
+                        cooldown=args.cooldown, scanner_mode=args.mode, roster=RosterIndex(db),
+                        key_path=args.key, accept_legacy=not args.signed_only,
+                        progress=lambda i, n: print(f"\r{i}/{n or '?'} frames", end="", flush=True))
+    except KeyboardInterrupt:
+        return
+    finally:
+        db.close()
+    print()
+    for when, who in report["saved"]:
+        print(f"✓ {when} {who}")
+    for when, who in report["duplicates"]:
+        print(f"= {when} {who}")
+    for when, why in report["failed"]:
+        print(f"⚠ {when} {why}")
+    print(f"{report['frames']} frames ({report['decoded']} decoded) in {report['elapsed_s']:.1f} s "
+          f"= {report['speed_x']:.1f}x real time; {len(report['saved'])} saved, "
+          f"{len(report['duplicates'])} duplicates, {len(report['failed'])} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import csv
+import qrpayload
+
+UNKNOWN_STUDENT = "ບໍ່ພົບລະຫັດໃນລາຍຊື່ (Unknown student)"
+NOT_ENROLLED = "ບໍ່ໄດ້ລົງທະບຽນວິຊານີ້ (Not enrolled)"
+LEGACY_REJECTED = "ບັດແບບເກົ່າບໍ່ຮອງຮັບ (Unsigned card)"
+
+
+def read_roster(path):
+    # Returns [(student_id, name, course or None)].
+    # Accepts a header with student_id/id, name/student_name and optional course/course_code,
+    # or bare "id,name[,course]" rows.
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = [r for r in csv.reader(f) if r and any(c.strip() for c in r)]
+    if not rows:
+        return []
+    header = [c.strip().lower() for c in rows[0]]
+    id_col, name_col, course_col = 0, 1, 2
+    if "name" in header or "student_name" in header:
+        id_col = header.index("student_id") if "student_id" in header else header.index("id")
+        name_col = header.index("name") if "name" in header else header.index("student_name")
+        course_col = next((header.index(c) for c in ("course", "course_code", "subject") if c in header), None)
+        rows = rows[1:]
+    out = []
+    for r in rows:
+        if len(r) <= max(id_col, name_col):
+            continue
+        course = r[course_col].strip() if course_col is not None and len(r) > course_col else ""
+        out.append((r[id_col].strip(), r[name_col].strip(), course or None))
+    return out
+
+
+def load_roster_csv(db, path, course=None):
+    # Bulk-load a roster file; `course` enrolls every row that has no course column value
+    rows = [(sid, name, c or course) for sid, name, c in read_roster(path)]
+    return db.import_roster(rows)
+
+
+class RosterIndex:
+    # In-memory hash index of the imported roster for O(1) validation on the scan path.
+    # Rebuilt whenever the roster changes through the same Database.
+    def __init__(self, db):
+        self.db = db
+        self._index = ({}, {})
+        self.refresh()
+        db.add_roster_listener(self.refresh)
+
+    def refresh(self):
+        students = dict(self.db.get_roster())
+        enrolled = {}
+        for course, sid in self.db.get_enrollments():
+            enrolled.setdefault(course, set()).add(sid)
+        # Swapped in with one assignment so scanning threads never see a half-built index
+        self._index = (students, enrolled)
+
+    @property
+    def active(self):
+        # Without an imported roster every well-formed card is accepted, as before
+        return bool(self._index[0])
+
+    def __len__(self):
+        return len(self._index[0])
+
+    def validate(self, student_id, course):
+        # Returns (ok, message, roster name or None).
+        # A course with no enrollments accepts any student on the roster.
+        students, enrolled = self._index
+        if not students:
+            return True, "", None
+        name = students.get(student_id)
+        if name is None:
+            return False, UNKNOWN_STUDENT, None
+        members = enrolled.get(course)
+        if members is not None and student_id not in members:
+            return False, NOT_ENROLLED, name
+        return True, "", name
+
+
+def resolve_checkin(data, course, index, db, key_path=qrpayload.KEY_FILE, accept_legacy=True):
+    # Everything a scan needs before it is saved: parse/verify the payload, check the
+    # roster and find a display name. Returns (student_id, name, error or None).
+    std_id, std_name, error = qrpayload.parse_payload(data, key_path)
+    if error is None and std_name is not None and not accept_legacy:
+        error = LEGACY_REJECTED
+    if error:
+        return std_id, std_name, error
+    ok, msg, roster_name = index.validate(std_id, course)
+    if roster_name:
+        std_name = roster_name
+    elif std_name is None:
+        # Signed cards carry no name; fall back to the last one seen for this ID
+        std_name = db.get_student_name(std_id)
+    return std_id, std_name, None if ok else msg
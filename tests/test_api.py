@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import pytest
+
+import qrpayload
+from api import MAX_BULK, ApiServer
+
+
+@pytest.fixture
+def server(db, tmp_path):
+    server = ApiServer(db, key_path=str(tmp_path / "qr_key.bin")).start()
+    yield server
+    server.stop()
+
+
+async def request(reader, writer, method, path, body=None, raw=None, headers=""):
+    data = raw if raw is not None else (json.dumps(body).encode("utf-8") if body is not None else b"")
+    length = "" if "Content-Length" in headers else f"Content-Length: {len(data)}\r\n"
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\n{length}{headers}\r\n".encode("latin-1") + data)
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    status = int(head.split()[1])
+    length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+    return status, json.loads(await reader.readexactly(length))
+
+
+def call(server, method, path, body=None, **kwargs):
+    # One request on a fresh connection
+    async def run():
+        reader, writer = await asyncio.open_connection(*server.address)
+        try:
+            return await request(reader, writer, method, path, body, **kwargs)
+        finally:
+            writer.close()
+    return asyncio.run(run())
+
+
+def test_subjects(server):
+    assert call(server, "POST", "/api/subjects", {"name": "Math"}) == (201, {"name": "Math"})
+    status, out = call(server, "POST", "/api/subjects", {"name": "Math"})
+    assert status == 409
+    assert call(server, "GET", "/api/subjects")[0] == 200
+    assert call(server, "POST", "/api/subjects", {})[0] == 400
+    assert call(server, "DELETE", "/api/subjects/Math") == (200, {"deleted": "Math"})
+
+
+def test_errors(server):
+    assert call(server, "GET", "/api/nothing")[0] == 404
+    assert call(server, "GET", "/elsewhere")[0] == 404
+    assert call(server, "PUT", "/api/subjects", {"name": "Math"})[0] == 405
+    assert call(server, "POST", "/api/subjects", raw=b"{not json")[0] == 400
+    assert call(server, "POST", "/api/checkin", {"course": "Math"})[0] == 400
+    assert call(server, "GET", "/api/attendance?date=06-01-2025")[0] == 400
+
+
+@pytest.mark.parametrize("length", ["-5", "abc"])
+def test_bad_content_length(server, length):
+    status, out = call(server, "POST", "/api/subjects", raw=b"", headers=f"Content-Length: {length}\r\n")
+    assert status == 400
+    assert out == {"error": "invalid Content-Length"}
+
+
+def test_checkin_and_duplicate(server):
+    body = {"course": "Math", "room": "101", "payload": "S1|Ann"}
+    status, out = call(server, "POST", "/api/checkin", body)
+    assert status == 200 and out["success"] and out["student_id"] == "S1"
+    status, out = call(server, "POST", "/api/checkin", body)
+    assert status == 200 and not out["success"]
+    status, out = call(server, "POST", "/api/checkin", {"course": "Math", "room": "101", "student_id": "S2", "name": "Bob"})
+    assert out["success"]
+    status, rows = call(server, "GET", "/api/attendance?subject=Math")
+    assert status == 200 and [r["student_id"] for r in rows] == ["S1", "S2"]
+    assert call(server, "GET", "/api/stats/Math")[1] == [{"student_name": "Ann", "count": 1}, {"student_name": "Bob", "count": 1}]
+
+
+def test_signed_card_without_key(server, tmp_path):
+    # The server's key file does not exist: cards are refused and no key is created
+    card = qrpayload.encode_payload("S1", key_path=str(tmp_path / "issuer.bin"))
+    status, out = call(server, "POST", "/api/checkin", {"course": "Math", "room": "101", "payload": card})
+    assert status == 200 and not out["success"]
+    assert out["message"].startswith(qrpayload.KEY_MISSING)
+    assert not (tmp_path / "qr_key.bin").exists()
+
+
+def test_bulk_checkins(server):
+    items = ["S1|Ann", "S2|Bob", "S1|Ann", "garbage", {"student_id": "S3", "name": "Cy"}]
+    status, out = call(server, "POST", "/api/checkins", {"course": "Math", "room": "101", "items": items})
+    assert status == 200
+    assert out["saved"] == 3
+    assert [r["success"] for r in out["results"]] == [True, True, False, False, True]
+    assert call(server, "POST", "/api/checkins", {"course": "Math", "room": "101", "items": []})[0] == 400
+    too_many = {"course": "Math", "room": "101", "items": ["S1|Ann"] * (MAX_BULK + 1)}
+    assert call(server, "POST", "/api/checkins", too_many)[0] == 413
+
+
+def test_keep_alive(server):
+    async def run():
+        reader, writer = await asyncio.open_connection(*server.address)
+        try:
+            statuses = [(await request(reader, writer, "GET", "/api/health"))[0] for _ in range(3)]
+        finally:
+            writer.close()
+        return statuses
+    assert asyncio.run(run()) == [200, 200, 200]
@@ -0,0 +1,158 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+from backend import ARCHIVED_TERM, Database, page_key
+
+
+def make_v0(path, rows):
+    # attendance.db as the original app created it, before any migration
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT, student_name TEXT, course_code TEXT, room TEXT, date_time TEXT
+        )
+    """)
+    conn.execute("CREATE TABLE subjects (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE)")
+    conn.executemany("INSERT INTO attendance (student_id, student_name, course_code, room, date_time) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_v0_keeps_rows(tmp_path):
+    path = str(tmp_path / "old.db")
+    make_v0(path, [
+        ("S1", "Ann", "Math", "101", "2025-01-06 08:00:00"),
+        ("S2", "Bob", "Math", "101", "2025-01-06 08:01:00"),
+        ("S1", "Ann", "Math", "101", "2025-01-07 08:00:00"),
+    ])
+    db = Database(path)
+    try:
+        assert db.schema_version() == len(Database.MIGRATIONS)
+        assert [r[1] for r in db.get_attendance_by_date("2025-01-06")] == ["S1", "S2"]
+        assert dict(db.get_subject_stats("Math")) == {"Ann": 2, "Bob": 1}
+        # The unique (student, course, day) constraint now applies
+        ok, _ = db.save_attendance("S1", "Ann", "Math", "101", when=datetime(2025, 1, 7, 9))
+        assert not ok
+    finally:
+        db.close()
+
+
+def test_migrate_is_idempotent(tmp_path):
+    path = str(tmp_path / "old.db")
+    make_v0(path, [("S1", "Ann", "Math", "101", "2025-01-06 08:00:00")])
+    Database(path).close()
+    db = Database(path)
+    try:
+        assert db.schema_version() == len(Database.MIGRATIONS)
+        assert len(db.get_attendance_by_date("2025-01-06")) == 1
+    finally:
+        db.close()
+
+
+def test_save_duplicate(db):
+    assert db.save_attendance("S1", "Ann", "Math", "101")[0]
+    assert not db.save_attendance("S1", "Ann", "Math", "101")[0]
+    assert db.save_attendance_bulk([("S1", "Ann"), ("S2", "Bob")], "Math", "101") == [False, True]
+
+
+def fill_term(db, days=5, students=4):
+    start = datetime(2025, 1, 6, 8)
+    for d in range(days):
+        for s in range(students):
+            ok, _ = db.save_attendance(f"S{s}", f"Student {s}", "Math", "101", when=start + timedelta(days=d, minutes=s))
+            assert ok
+
+
+def test_archive_term(db):
+    fill_term(db)
+    db.save_attendance("S0", "Student 0", "Math", "101", when=datetime(2025, 7, 1, 8))
+    assert db.archive_term("2025-S1", "2025-01-01", "2025-05-31") == 20
+    name, start, end, path, rows, _ = db.get_terms()[0]
+    assert (name, start, end, rows) == ("2025-S1", "2025-01-01", "2025-05-31", 20)
+    # Reads still see archived rows; aggregates keep counting them
+    assert len(db.get_attendance_by_date("2025-01-06")) == 4
+    assert db.count_attendance("2025-01-01", "2025-12-31") == 21
+    assert db.get_student_stats("S0") == 6
+    # The live table only keeps the open term
+    assert db._reader().execute("SELECT COUNT(*) FROM attendance").fetchone()[0] == 1
+
+
+def test_archived_term_is_read_only(db):
+    fill_term(db)
+    db.archive_term("2025-S1", "2025-01-01", "2025-05-31")
+    assert db.save_attendance("S0", "Student 0", "Math", "101", when=datetime(2025, 1, 6, 9)) == (False, ARCHIVED_TERM)
+    assert db.save_attendance_bulk([("S9", None, datetime(2025, 2, 1)), ("S9", None, datetime(2025, 7, 1))],
+                                   "Math", "101") == [None, True]
+    assert db.get_student_stats("S0") == 5
+
+
+def test_archive_rejects_open_and_overlapping_terms(db):
+    fill_term(db)
+    today = datetime.now().strftime("%Y-%m-%d")
+    with pytest.raises(ValueError):
+        db.archive_term("now", "2025-01-01", today)
+    db.archive_term("2025-S1", "2025-01-01", "2025-01-31")
+    with pytest.raises(ValueError):
+        db.archive_term("again", "2025-01-15", "2025-02-28")
+
+
+def test_archive_rolls_back_if_range_changes(db, monkeypatch):
+    fill_term(db)
+    copy_term = archive.copy_term
+
+    def racing_copy(src, path, start_day, end_day):
+        copied = copy_term(src, path, start_day, end_day)
+        # A history delete plus a backdated insert: the row count in the range is unchanged
+        first = db.get_attendance_by_date("2025-01-06")[0][0]
+        db.delete_attendance(first)
+        db.save_attendance("S9", "Late", "Math", "101", when=datetime(2025, 1, 20, 8))
+        return copied
+
+    monkeypatch.setattr(archive, "copy_term", racing_copy)
+    with pytest.raises(RuntimeError):
+        db.archive_term("2025-S1", "2025-01-01", "2025-05-31")
+    assert db.get_terms() == []
+    assert db.count_attendance("2025-01-01", "2025-05-31") == 20
+    assert db.get_student_stats("S9") == 1
+
+
+def all_pages(db, limit, **kwargs):
+    rows, after = [], None
+    while True:
+        page = db.get_attendance_page("2025-01-01", "2025-12-31", after=after, limit=limit, **kwargs)
+        rows += page
+        if len(page) < limit:
+            return rows
+        after = page_key(page[-1])
+
+
+@pytest.mark.parametrize("archived", [False, True])
+def test_keyset_paging(db, archived):
+    fill_term(db, days=6, students=5)
+    for s in range(3):
+        db.save_attendance(f"S{s}", f"Student {s}", "Art", "102", when=datetime(2025, 1, 7, 10, s))
+    if archived:
+        # Pages then merge the live table with the archive
+        db.archive_term("2025-W1", "2025-01-01", "2025-01-08")
+    full = db.get_attendance_page("2025-01-01", "2025-12-31", limit=1000)
+    assert len(full) == 33
+    assert [page_key(r) for r in full] == sorted(page_key(r) for r in full)
+    for limit in (1, 4, 7, 33, 50):
+        assert all_pages(db, limit) == full
+
+    # Walking back from the last row with before= gives the same rows
+    rows, before = [full[-1]], page_key(full[-1])
+    while True:
+        page = db.get_attendance_page("2025-01-01", "2025-12-31", before=before, limit=4)
+        rows = page + rows
+        if len(page) < 4:
+            break
+        before = page_key(page[0])
+    assert rows == full
+
+    math = all_pages(db, 4, subject="Math")
+    assert [r for r in full if r[3] == "Math"] == math